@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+import tempfile
+import time
+
+from src.chunking import CHUNKERS, Chunker, crear_chunker
+from src.evaluation import recall_fragmentos
+from src.labels import (
+    ETIQUETAS_POR_DEFECTO,
+    PROJECT_ROOT,
+    ConsultaEtiquetada,
+    cargar_etiquetas,
+    localizar_fragmentos,
+)
+from src.modes import classic_mode, semantic_mode
+from src.preprocessing import SPACY_MODEL, QuijoteIndex, cargar_modelo_nlp
+from src.snapshot import exportar_indice
+
+
+@dataclass(slots=True)
+class MedidaChunker:
+    nombre: str
+    chunks: int
+    segundos: float
+    # Tamano del indice: snapshot en disco (comprimido), texto del corpus en
+    # memoria y entradas de las postings posicionales.
+    bytes_snapshot: int
+    bytes_texto: int
+    posiciones: int
+    # Fragmentos etiquetados que caben enteros en algun chunk.
+    localizables: float
+    recall_clasico: float
+    recall_semantico: float
+
+
+def medir_chunker(
+    nlp,
+    paths: list[Path],
+    chunker: Chunker,
+    etiquetas: list[ConsultaEtiquetada],
+    k: int = 5,
+) -> MedidaChunker:
+    """Indexa `paths` con `chunker` y mide tamano, tiempo y recall@k.
+
+    El recall se cuenta por fragmento etiquetado (que parte de los
+    fragmentos de cada consulta aparece en alguno de los `k` primeros
+    chunks), asi que es comparable entre estrategias aunque cambien los
+    chunks.
+    """
+    index = QuijoteIndex(nlp, chunker=chunker)
+    started = time.perf_counter()
+    stats = index.cargar_archivos(paths)
+    segundos = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bytes_snapshot = exportar_indice(index, Path(tmp) / "indice.p4idx")
+
+    fragmentos = localizar_fragmentos(index, etiquetas)
+    localizables = [
+        sum(1 for chunks in por_fragmento if chunks) / len(por_fragmento)
+        for por_fragmento in fragmentos
+    ]
+    recall_clasico: list[float] = []
+    recall_semantico: list[float] = []
+    for etiqueta, por_fragmento in zip(etiquetas, fragmentos):
+        for modo, recalls in (
+            (classic_mode, recall_clasico),
+            (semantic_mode, recall_semantico),
+        ):
+            _, resultados = modo.buscar(index, etiqueta.consulta, k)
+            top = {resultado.chunk.chunk_id for resultado in resultados}
+            recalls.append(recall_fragmentos(por_fragmento, top))
+
+    return MedidaChunker(
+        nombre=chunker.nombre,
+        chunks=stats["chunks"],
+        segundos=segundos,
+        bytes_snapshot=bytes_snapshot,
+        bytes_texto=index.corpus.tamano_bytes,
+        posiciones=sum(
+            len(tokens) for listas in index.posiciones.values() for tokens in listas
+        ),
+        localizables=_media(localizables),
+        recall_clasico=_media(recall_clasico),
+        recall_semantico=_media(recall_semantico),
+    )
+
+
+def formatear_tabla(medidas: list[MedidaChunker], k: int) -> str:
+    cabecera = (
+        f"{'estrategia':<10} {'chunks':>7} {'tiempo':>8} {'snapshot':>9} "
+        f"{'texto':>8} {'posic.':>8} {'localiz.':>8} "
+        f"{f'R@{k} cla':>9} {f'R@{k} sem':>9}"
+    )
+    filas = [cabecera, "-" * len(cabecera)]
+    for medida in medidas:
+        filas.append(
+            f"{medida.nombre:<10} {medida.chunks:>7} {medida.segundos:>7.1f}s "
+            f"{medida.bytes_snapshot / 1e6:>7.2f}MB {medida.bytes_texto / 1e6:>6.2f}MB "
+            f"{medida.posiciones:>8} {medida.localizables:>8.2f} "
+            f"{medida.recall_clasico:>9.2f} {medida.recall_semantico:>9.2f}"
+        )
+    return "\n".join(filas)
+
+
+def _media(valores: list[float]) -> float:
+    return sum(valores) / len(valores) if valores else 0.0
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Compara estrategias de chunking: tamano, tiempo y recall."
+    )
+    parser.add_argument(
+        "corpus",
+        nargs="*",
+        type=Path,
+        default=[PROJECT_ROOT / "2000-h.htm"],
+        help="HTML a indexar (por defecto 2000-h.htm).",
+    )
+    parser.add_argument("--etiquetas", type=Path, default=ETIQUETAS_POR_DEFECTO)
+    parser.add_argument(
+        "--estrategias",
+        default=",".join(CHUNKERS),
+        help=f"Lista separada por comas de: {', '.join(CHUNKERS)}.",
+    )
+    parser.add_argument("-k", type=int, default=5, help="Profundidad del recall.")
+    parser.add_argument("--modelo", default=SPACY_MODEL)
+    args = parser.parse_args(argv)
+
+    etiquetas = cargar_etiquetas(args.etiquetas)
+    nlp = cargar_modelo_nlp(args.modelo)
+    medidas = []
+    for nombre in args.estrategias.split(","):
+        chunker = crear_chunker(nombre.strip())
+        medidas.append(medir_chunker(nlp, args.corpus, chunker, etiquetas, args.k))
+        print(f"{chunker.nombre}: {medidas[-1].chunks} chunks", flush=True)
+    print()
+    print(formatear_tabla(medidas, args.k))
+
+
+if __name__ == "__main__":
+    main()
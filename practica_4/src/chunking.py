@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+import math
+import os
+import re
+
+
+CHUNKER_PALABRAS = "palabras"
+CHUNKER_FRASES = "frases"
+CHUNKER_SECCION = "seccion"
+CHUNKER_TOKENS = "tokens"
+CHUNKERS = (CHUNKER_PALABRAS, CHUNKER_FRASES, CHUNKER_SECCION, CHUNKER_TOKENS)
+
+# Una palabra cierra frase si termina en . ! ? o ... aunque detras vengan
+# comillas, parentesis o rayas de dialogo.
+_FIN_FRASE = re.compile(r"[.!?…][»”\"')\]—]*$")
+# Piezas que un tokenizador BPE suele separar: palabras y signos sueltos.
+_PIEZAS = re.compile(r"\w+|[^\w\s]")
+
+
+def estimar_tokens(palabra: str) -> int:
+    """Tokens aproximados de una palabra para el modelo de RAG.
+
+    Cada signo de puntuacion cuenta uno y cada tramo alfanumerico uno por
+    cada 4 caracteres, que es lo que ocupa de media un token en espanol en
+    los vocabularios BPE habituales.
+    """
+    return sum(math.ceil(len(pieza) / 4) for pieza in _PIEZAS.findall(palabra)) or 1
+
+
+class Chunker:
+    """Trocea los parrafos de una seccion en unidades y las agrupa en chunks.
+
+    Cada parrafo se divide en palabras una sola vez: de ahi salen su peso
+    (palabras o tokens) y, si supera el limite, los cortes internos. Luego se
+    agrupan unidades consecutivas hasta llenar el limite, retrocediendo en
+    cada chunk hasta acumular `solape` de contexto compartido.
+    """
+
+    nombre = ""
+
+    def __init__(self, limite: int, solape: int) -> None:
+        self.limite = limite
+        self.solape = solape
+
+    def trocear(self, parrafos: list[str]) -> tuple[list[str], list[tuple[int, int]]]:
+        """Unidades de texto y rangos [inicio, fin) de unidades de cada chunk."""
+        unidades: list[str] = []
+        pesos: list[int] = []
+        for parrafo in parrafos:
+            palabras = parrafo.split()
+            pesos_palabra = self._pesos_palabras(palabras)
+            total = sum(pesos_palabra)
+            if total <= self.limite:
+                unidades.append(parrafo)
+                pesos.append(total)
+                continue
+            for inicio, fin in self._partir(palabras, pesos_palabra):
+                unidades.append(" ".join(palabras[inicio:fin]))
+                pesos.append(sum(pesos_palabra[inicio:fin]))
+        if not unidades:
+            return [], []
+        return unidades, self._agrupar(pesos)
+
+    def _pesos_palabras(self, palabras: list[str]) -> list[int]:
+        return [1] * len(palabras)
+
+    def _partir(self, palabras: list[str], pesos: list[int]) -> list[tuple[int, int]]:
+        return _ventanas(pesos, 0, len(pesos), self.limite, self.solape)
+
+    def _agrupar(self, pesos: list[int]) -> list[tuple[int, int]]:
+        return _agrupar_con_solape(pesos, self.limite, self.solape)
+
+
+class VentanaPalabras(Chunker):
+    """Ventanas de `limite` palabras con `solape` palabras de solape."""
+
+    nombre = CHUNKER_PALABRAS
+
+
+class PorFrases(Chunker):
+    """Como `VentanaPalabras`, pero los parrafos largos se cortan por frases.
+
+    Cada frase de un parrafo largo es una unidad, asi que ni los chunks ni el
+    solape empiezan a mitad de frase. Solo una frase que por si sola supera
+    el limite se parte en ventanas de palabras.
+    """
+
+    nombre = CHUNKER_FRASES
+
+    def _partir(self, palabras: list[str], pesos: list[int]) -> list[tuple[int, int]]:
+        cortes: list[tuple[int, int]] = []
+        inicio = 0
+        peso = 0
+        for i, palabra in enumerate(palabras):
+            peso += pesos[i]
+            if _FIN_FRASE.search(palabra) is None and i + 1 < len(palabras):
+                continue
+            if peso <= self.limite:
+                cortes.append((inicio, i + 1))
+            else:
+                cortes.extend(_ventanas(pesos, inicio, i + 1, self.limite, self.solape))
+            inicio = i + 1
+            peso = 0
+        return cortes
+
+
+class PorSeccion(Chunker):
+    """Chunks que reparten cada seccion en partes de tamano parecido.
+
+    Una seccion que cabe en el limite es un unico chunk. Si no, se reparte
+    en partes de tamano parecido que no pasan del limite, cortando siempre
+    entre unidades y sin solape: no quedan restos diminutos al final de un
+    capitulo.
+    """
+
+    nombre = CHUNKER_SECCION
+
+    def _agrupar(self, pesos: list[int]) -> list[tuple[int, int]]:
+        total = sum(pesos)
+        partes = max(1, math.ceil(total / self.limite))
+        rangos: list[tuple[int, int]] = []
+        inicio = 0
+        acumulado = 0
+        parte = 0
+        for i, peso in enumerate(pesos):
+            # Se corta antes de la unidad que cruza el objetivo de la parte si
+            # asi se queda mas cerca de el, o si con ella se pasaria del limite.
+            objetivo = total * (len(rangos) + 1) / partes
+            if i > inicio and (
+                parte + peso > self.limite
+                or objetivo - acumulado <= acumulado + peso - objetivo
+            ):
+                rangos.append((inicio, i))
+                inicio = i
+                parte = 0
+            acumulado += peso
+            parte += peso
+        rangos.append((inicio, len(pesos)))
+        return rangos
+
+
+class PresupuestoTokens(Chunker):
+    """Chunks de como mucho `limite` tokens del modelo de RAG.
+
+    `contar` da los tokens de una palabra; por defecto `estimar_tokens`, pero
+    se puede pasar el tokenizador real del modelo.
+    """
+
+    nombre = CHUNKER_TOKENS
+
+    def __init__(
+        self,
+        limite: int = 300,
+        solape: int = 75,
+        contar: Callable[[str], int] | None = None,
+    ) -> None:
+        super().__init__(limite, solape)
+        self.contar = contar or estimar_tokens
+
+    def _pesos_palabras(self, palabras: list[str]) -> list[int]:
+        return [self.contar(palabra) for palabra in palabras]
+
+
+def crear_chunker(
+    nombre: str = CHUNKER_PALABRAS,
+    chunk_size_words: int = 180,
+    chunk_overlap_words: int = 45,
+) -> Chunker:
+    if nombre == CHUNKER_PALABRAS:
+        return VentanaPalabras(chunk_size_words, chunk_overlap_words)
+    if nombre == CHUNKER_FRASES:
+        return PorFrases(chunk_size_words, chunk_overlap_words)
+    if nombre == CHUNKER_SECCION:
+        return PorSeccion(chunk_size_words, 0)
+    if nombre == CHUNKER_TOKENS:
+        defaults = PresupuestoTokens()
+        return PresupuestoTokens(
+            int(os.getenv("P4_CHUNK_TOKENS", defaults.limite)),
+            int(os.getenv("P4_CHUNK_OVERLAP_TOKENS", defaults.solape)),
+        )
+    raise ValueError(
+        f"Estrategia de chunking desconocida: {nombre}. "
+        f"Usa una de: {', '.join(CHUNKERS)}."
+    )
+
+
+def chunker_desde_entorno(
+    chunk_size_words: int = 180, chunk_overlap_words: int = 45
+) -> Chunker:
+    """Estrategia elegida con `P4_CHUNKER` (por defecto ventanas de palabras)."""
+    nombre = os.getenv("P4_CHUNKER", CHUNKER_PALABRAS).strip().lower()
+    return crear_chunker(nombre, chunk_size_words, chunk_overlap_words)
+
+
+def _ventanas(
+    pesos: list[int], inicio: int, fin: int, limite: int, solape: int
+) -> list[tuple[int, int]]:
+    # Ventanas [a, b) sobre pesos[inicio:fin] de como mucho `limite` (al menos
+    # un elemento cada una); la siguiente retrocede hasta cubrir `solape`.
+    ventanas: list[tuple[int, int]] = []
+    start = inicio
+    while start < fin:
+        end = start + 1
+        total = pesos[start]
+        while end < fin and total + pesos[end] <= limite:
+            total += pesos[end]
+            end += 1
+        ventanas.append((start, end))
+        if end >= fin:
+            break
+        next_start = end
+        overlap = 0
+        while next_start > start + 1 and overlap + pesos[next_start - 1] <= solape:
+            next_start -= 1
+            overlap += pesos[next_start]
+        start = next_start
+    return ventanas
+
+
+def _agrupar_con_solape(
+    pesos: list[int], limite: int, solape: int
+) -> list[tuple[int, int]]:
+    # Agrupa unidades hasta llenar `limite`; el siguiente grupo retrocede
+    # unidades enteras hasta acumular al menos `solape`.
+    rangos: list[tuple[int, int]] = []
+    start = 0
+    while start < len(pesos):
+        total = 0
+        end = start
+        while end < len(pesos):
+            if end > start and total + pesos[end] > limite:
+                break
+            total += pesos[end]
+            end += 1
+            if total >= limite:
+                break
+        rangos.append((start, end))
+
+        if end >= len(pesos):
+            break
+
+        overlap = 0
+        next_start = end
+        while next_start > start and overlap < solape:
+            next_start -= 1
+            overlap += pesos[next_start]
+        start = end if next_start == start else next_start
+    return rangos
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+import zlib
+
+
+SEPARADOR_PARRAFOS = "\n\n"
+
+
+class CorpusBuffer:
+    """Texto de todas las secciones del corpus en un unico buffer UTF-8.
+
+    Cada seccion se guarda una sola vez, como un bloque con sus parrafos
+    unidos por `SEPARADOR_PARRAFOS`, y cada chunk es un tramo [inicio, fin)
+    de bytes de su bloque: el solape entre chunks no duplica texto. El `str`
+    solo se crea al pedir un fragmento (al mostrarlo o enviarlo a RAG).
+
+    Con `comprimir`, cada bloque se guarda comprimido con zlib y se
+    descomprime bajo demanda, con una cache LRU de los ultimos bloques.
+    """
+
+    def __init__(self, comprimir: bool = False, bloques_en_cache: int = 32) -> None:
+        self.comprimir = comprimir
+        self.bloques_en_cache = bloques_en_cache
+        # Sin comprimir: todos los bloques seguidos y el inicio de cada uno.
+        self._datos = bytearray()
+        self._inicios: list[int] = []
+        # Comprimido: un `bytes` de zlib por bloque.
+        self._comprimidos: list[bytes] = []
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._comprimidos) if self.comprimir else len(self._inicios)
+
+    @property
+    def tamano_bytes(self) -> int:
+        if self.comprimir:
+            return sum(len(bloque) for bloque in self._comprimidos)
+        return len(self._datos)
+
+    def anadir_bloque(self, parrafos: list[str]) -> tuple[int, list[tuple[int, int]]]:
+        """Guarda una seccion; devuelve su id y el tramo en bytes de cada parrafo."""
+        separador = SEPARADOR_PARRAFOS.encode("utf-8")
+        tramos: list[tuple[int, int]] = []
+        partes: list[bytes] = []
+        offset = 0
+        for parrafo in parrafos:
+            if partes:
+                partes.append(separador)
+                offset += len(separador)
+            encoded = parrafo.encode("utf-8")
+            partes.append(encoded)
+            tramos.append((offset, offset + len(encoded)))
+            offset += len(encoded)
+        datos = b"".join(partes)
+
+        bloque = len(self)
+        if self.comprimir:
+            self._comprimidos.append(zlib.compress(datos))
+        else:
+            self._inicios.append(len(self._datos))
+            self._datos += datos
+        return bloque, tramos
+
+    def fragmento(self, bloque: int, inicio: int, fin: int) -> str:
+        if not self.comprimir:
+            base = self._inicios[bloque]
+            return self._datos[base + inicio : base + fin].decode("utf-8")
+        return self._bloque_descomprimido(bloque)[inicio:fin].decode("utf-8")
+
+    def bloque(self, bloque: int) -> str:
+        """Texto completo de un bloque (una seccion)."""
+        if not self.comprimir:
+            fin = (
+                self._inicios[bloque + 1]
+                if bloque + 1 < len(self._inicios)
+                else len(self._datos)
+            )
+            return self._datos[self._inicios[bloque] : fin].decode("utf-8")
+        return self._bloque_descomprimido(bloque).decode("utf-8")
+
+    def _bloque_descomprimido(self, bloque: int) -> bytes:
+        with self._lock:
+            datos = self._cache.get(bloque)
+            if datos is not None:
+                self._cache.move_to_end(bloque)
+                return datos
+
+        datos = zlib.decompress(self._comprimidos[bloque])
+        with self._lock:
+            self._cache[bloque] = datos
+            if len(self._cache) > self.bloques_en_cache:
+                self._cache.popitem(last=False)
+        return datos
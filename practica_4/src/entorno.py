@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import os
+
+
+# Valores que activan una variable booleana `P4_*` (sin distinguir mayusculas).
+VALORES_ACTIVO = frozenset({"1", "true", "si", "yes", "on"})
+
+
+def flag_activo(nombre: str) -> bool:
+    """Lee la variable de entorno booleana `nombre` (desactivada si no existe)."""
+    return os.getenv(nombre, "").strip().lower() in VALORES_ACTIVO
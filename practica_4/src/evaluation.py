@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+import json
+import math
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+
+from src.fusion import FusionConfig, RankedLeg, aprender_peso_lineal
+from src.labels import (
+    ETIQUETAS_POR_DEFECTO,
+    PROJECT_ROOT,
+    ConsultaEtiquetada,
+    cargar_etiquetas,
+    localizar_fragmentos,
+)
+from src.modes import MODE_CLASSIC, MODE_RAG, MODE_SEMANTIC
+from src.modes import classic_mode, semantic_mode
+from src.modes.rag_mode import recuperar_contexto
+from src.preprocessing import SPACY_MODEL, QuijoteIndex, cargar_modelo_nlp
+
+
+MODOS_EVALUADOS = (MODE_CLASSIC, MODE_SEMANTIC, MODE_RAG)
+
+
+@dataclass(slots=True)
+class MedidaModo:
+    modo: str
+    consultas: int
+    mrr: float
+    ndcg: float
+    recall: float
+    p50_ms: float
+    p95_ms: float
+    # Pico de memoria Python reservada durante una consulta (la peor).
+    pico_kb: float
+
+
+def recall_fragmentos(por_fragmento: list[frozenset[int]], top: set[int]) -> float:
+    """Parte de los fragmentos etiquetados presentes en algun chunk de `top`."""
+    encontrados = sum(1 for chunks in por_fragmento if chunks & top)
+    return encontrados / len(por_fragmento)
+
+
+def reciprocal_rank(ranking: list[int], relevantes: frozenset[int]) -> float:
+    for rank, chunk_id in enumerate(ranking, start=1):
+        if chunk_id in relevantes:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg(ranking: list[int], relevantes: frozenset[int], k: int) -> float:
+    """nDCG@k con relevancia binaria."""
+    dcg = sum(
+        1.0 / math.log2(rank + 1)
+        for rank, chunk_id in enumerate(ranking[:k], start=1)
+        if chunk_id in relevantes
+    )
+    ideal = sum(
+        1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevantes), k) + 1)
+    )
+    return dcg / ideal if ideal else 0.0
+
+
+def percentil(valores: list[float], p: float) -> float:
+    """Percentil por rango mas cercano."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def recuperadores(index: QuijoteIndex, k: int) -> dict[str, Callable[[str], list[int]]]:
+    """Para cada modo, una funcion consulta -> ids de sus `k` primeros chunks.
+
+    RAG usa la fusion (y el reordenado, si esta activo) con la configuracion
+    de las variables de entorno, pero no llama a Ollama. Se le pasa `k`
+    explicitamente: si no, con el reordenado activo devolveria solo
+    `P4_RAG_RERANK_TOP` pasajes y sus metricas no serian comparables.
+    """
+
+    def ids(resultados) -> list[int]:
+        return [resultado.chunk.chunk_id for resultado in resultados]
+
+    return {
+        MODE_CLASSIC: lambda consulta: ids(classic_mode.buscar(index, consulta, k)[1]),
+        MODE_SEMANTIC: lambda consulta: ids(
+            semantic_mode.buscar(index, consulta, k)[1]
+        ),
+        MODE_RAG: lambda consulta: ids(
+            recuperar_contexto(index, consulta, output_limit=k)[1]
+        ),
+    }
+
+
+def evaluar(
+    index: QuijoteIndex,
+    etiquetas: list[ConsultaEtiquetada],
+    k: int = 10,
+    repeticiones: int = 3,
+    modos: tuple[str, ...] = MODOS_EVALUADOS,
+) -> list[MedidaModo]:
+    """Calidad y coste de cada modo sobre las consultas etiquetadas.
+
+    Cada consulta se ejecuta `repeticiones` veces para la latencia y una mas
+    con `tracemalloc` para la memoria, que ralentiza mucho y por eso no se
+    mezcla con las medidas de tiempo. Los rankings son deterministas, asi que
+    la calidad se mide sobre cualquiera de las ejecuciones.
+    """
+    fragmentos = localizar_fragmentos(index, etiquetas)
+    relevantes = [frozenset().union(*por_fragmento) for por_fragmento in fragmentos]
+    funciones = recuperadores(index, k)
+
+    medidas: list[MedidaModo] = []
+    for modo in modos:
+        recuperar = funciones[modo]
+        mrr: list[float] = []
+        ndcgs: list[float] = []
+        recalls: list[float] = []
+        latencias: list[float] = []
+        pico = 0
+        for etiqueta, por_fragmento, relevantes_consulta in zip(
+            etiquetas, fragmentos, relevantes
+        ):
+            ranking: list[int] = []
+            for _ in range(max(1, repeticiones)):
+                started = time.perf_counter()
+                ranking = recuperar(etiqueta.consulta)
+                latencias.append((time.perf_counter() - started) * 1000)
+            mrr.append(reciprocal_rank(ranking, relevantes_consulta))
+            ndcgs.append(ndcg(ranking, relevantes_consulta, k))
+            recalls.append(recall_fragmentos(por_fragmento, set(ranking)))
+
+            tracemalloc.start()
+            recuperar(etiqueta.consulta)
+            pico = max(pico, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        medidas.append(
+            MedidaModo(
+                modo=modo,
+                consultas=len(etiquetas),
+                mrr=_media(mrr),
+                ndcg=_media(ndcgs),
+                recall=_media(recalls),
+                p50_ms=percentil(latencias, 50),
+                p95_ms=percentil(latencias, 95),
+                pico_kb=pico / 1024,
+            )
+        )
+    return medidas
+
+
+def aprender_peso(
+    index: QuijoteIndex, etiquetas: list[ConsultaEtiquetada], k: int = 10
+) -> float:
+    """Peso clasico de la fusion lineal que maximiza el MRR@k de las etiquetas.
+
+    Las piernas clasica y semantica se recuperan como en RAG, con las
+    profundidades de las variables `P4_FUSION_*`. El resultado es el valor a
+    poner en `P4_FUSION_WEIGHT` (con `P4_FUSION_METHOD=lineal`).
+    """
+    config = FusionConfig.desde_entorno()
+    fragmentos = localizar_fragmentos(index, etiquetas)
+
+    def pierna(cursor, profundidad: int) -> RankedLeg:
+        # El cursor da posiciones en `index.chunks`; las etiquetas, chunk_id.
+        return RankedLeg.desde_pares(
+            [
+                (score, index.chunks[posicion].chunk_id)
+                for score, posicion in cursor.mejores(profundidad)
+            ]
+        )
+
+    ejemplos = []
+    for etiqueta, por_fragmento in zip(etiquetas, fragmentos):
+        _, clasico = classic_mode.buscar_paginado(index, etiqueta.consulta)
+        _, semantico = semantic_mode.buscar_paginado(index, etiqueta.consulta)
+        ejemplos.append(
+            (
+                pierna(clasico, config.profundidad_clasica),
+                pierna(semantico, config.profundidad_semantica),
+                frozenset().union(*por_fragmento),
+            )
+        )
+    return aprender_peso_lineal(ejemplos, profundidad=k)
+
+
+def formatear_tabla(medidas: list[MedidaModo], k: int) -> str:
+    cabecera = (
+        f"{'modo':<9} {f'MRR@{k}':>7} {f'nDCG@{k}':>8} {f'R@{k}':>6} "
+        f"{'p50':>9} {'p95':>9} {'pico mem':>10}"
+    )
+    filas = [cabecera, "-" * len(cabecera)]
+    for medida in medidas:
+        filas.append(
+            f"{medida.modo:<9} {medida.mrr:>7.3f} {medida.ndcg:>8.3f} "
+            f"{medida.recall:>6.3f} {medida.p50_ms:>7.1f}ms {medida.p95_ms:>7.1f}ms "
+            f"{medida.pico_kb:>8.0f}KB"
+        )
+    return "\n".join(filas)
+
+
+def _rss_maximo_mb() -> float | None:
+    """RSS maximo del proceso, o None donde no hay `resource` (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # En Linux `ru_maxrss` viene en KB (en macOS, en bytes).
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _formatear_mb(mb: float | None) -> str:
+    return "?" if mb is None else f"{mb:.0f} MB"
+
+
+def _media(valores: list[float]) -> float:
+    return sum(valores) / len(valores) if valores else 0.0
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Evalua calidad y latencia de los modos de recuperacion."
+    )
+    parser.add_argument(
+        "corpus",
+        nargs="*",
+        type=Path,
+        default=[PROJECT_ROOT / "2000-h.htm"],
+        help="HTML o snapshot .p4idx a cargar (por defecto 2000-h.htm).",
+    )
+    parser.add_argument("--etiquetas", type=Path, default=ETIQUETAS_POR_DEFECTO)
+    parser.add_argument("-k", type=int, default=10, help="Profundidad de las metricas.")
+    parser.add_argument(
+        "--repeticiones", type=int, default=3, help="Ejecuciones por consulta."
+    )
+    parser.add_argument(
+        "--modos",
+        default=",".join(MODOS_EVALUADOS),
+        help=f"Lista separada por comas de: {', '.join(MODOS_EVALUADOS)}.",
+    )
+    parser.add_argument("--modelo", default=SPACY_MODEL)
+    parser.add_argument("--json", type=Path, help="Guarda tambien las medidas en JSON.")
+    parser.add_argument(
+        "--aprender-peso",
+        action="store_true",
+        help="Aprende tambien el peso de la fusion lineal (P4_FUSION_WEIGHT).",
+    )
+    args = parser.parse_args(argv)
+
+    modos = tuple(modo.strip() for modo in args.modos.split(","))
+    desconocidos = [modo for modo in modos if modo not in MODOS_EVALUADOS]
+    if desconocidos:
+        parser.error(f"Modos desconocidos: {', '.join(desconocidos)}.")
+
+    etiquetas = cargar_etiquetas(args.etiquetas)
+    nlp = cargar_modelo_nlp(args.modelo)
+    rss_modelo = _rss_maximo_mb()
+    index = QuijoteIndex(nlp)
+    started = time.perf_counter()
+    stats = index.cargar_archivos(args.corpus)
+    segundos_indice = time.perf_counter() - started
+    rss_indice = _rss_maximo_mb()
+
+    medidas = evaluar(index, etiquetas, args.k, args.repeticiones, modos)
+    print(
+        f"{len(etiquetas)} consultas · {stats['chunks']} chunks · "
+        f"indice en {segundos_indice:.1f}s · RSS maximo: "
+        f"modelo {_formatear_mb(rss_modelo)}, con indice {_formatear_mb(rss_indice)}, "
+        f"final {_formatear_mb(_rss_maximo_mb())}"
+    )
+    print()
+    print(formatear_tabla(medidas, args.k))
+
+    peso: float | None = None
+    if args.aprender_peso:
+        peso = aprender_peso(index, etiquetas, args.k)
+        print()
+        print(f"Peso clasico aprendido (MRR@{args.k}): P4_FUSION_WEIGHT={peso:.2f}")
+
+    if args.json is not None:
+        args.json.write_text(
+            json.dumps(
+                {
+                    "k": args.k,
+                    "chunks": stats["chunks"],
+                    "segundos_indice": segundos_indice,
+                    "rss_modelo_mb": rss_modelo,
+                    "rss_indice_mb": rss_indice,
+                    "modos": [asdict(medida) for medida in medidas],
+                    "peso_fusion_lineal": peso,
+                },
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+import os
+from typing import TYPE_CHECKING
+
+from src.entorno import flag_activo
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+@dataclass(slots=True, frozen=True)
+class ExpansionConfig:
+    activo: bool = False
+    # Lemas vecinos que se anaden como maximo por cada lema de la consulta.
+    vecinos: int = 3
+    similitud_minima: float = 0.6
+    # Un lema expandido pesa `peso * similitud` frente al 1 de los originales.
+    peso: float = 0.5
+
+    @classmethod
+    def desde_entorno(cls) -> "ExpansionConfig":
+        """Configuracion por defecto sobrescrita con variables `P4_EXPANSION*`."""
+        defaults = cls()
+        return cls(
+            activo=flag_activo("P4_CLASSIC_EXPANSION"),
+            vecinos=int(os.getenv("P4_EXPANSION_NEIGHBORS", defaults.vecinos)),
+            similitud_minima=float(
+                os.getenv("P4_EXPANSION_MIN_SIMILARITY", defaults.similitud_minima)
+            ),
+            peso=float(os.getenv("P4_EXPANSION_WEIGHT", defaults.peso)),
+        )
+
+
+class MatrizLemas:
+    """Vectores unitarios de los lemas del vocabulario indexado, por filas.
+
+    Se construye una vez al indexar; buscar los vecinos de los lemas de una
+    consulta es un unico producto matricial contra toda la matriz.
+    """
+
+    def __init__(self, lemas: list[str], vectores: np.ndarray) -> None:
+        # El modo clasico importa este modulo al arrancar la TUI; numpy solo
+        # se carga cuando se construye la matriz (al indexar).
+        import numpy as np
+
+        norms = np.linalg.norm(vectores, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.lemas = lemas
+        self.vectores = (vectores / norms).astype(np.float32)
+        self.fila = {lema: row for row, lema in enumerate(lemas)}
+
+    @classmethod
+    def construir(cls, lemas: Iterable[str], vocab) -> "MatrizLemas":
+        """Toma el vector de spaCy de cada lema que lo tenga en `vocab`."""
+        import numpy as np
+
+        con_vector = [lema for lema in lemas if vocab.has_vector(lema)]
+        if not con_vector:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        vectores = np.stack([vocab.get_vector(lema) for lema in con_vector])
+        return cls(con_vector, vectores)
+
+    def vecinos(
+        self, lemas: Iterable[str], k: int, similitud_minima: float
+    ) -> dict[str, float]:
+        """Hasta `k` lemas mas similares a cada uno de `lemas`.
+
+        Devuelve lema expandido -> mejor similitud coseno encontrada. Los
+        propios lemas de la consulta nunca se devuelven. El orden del dict
+        (que fija el de las sumas del ranking clasico) solo depende de la
+        consulta: sus lemas en orden y, para cada uno, los vecinos de mas a
+        menos similares.
+        """
+        originales = dict.fromkeys(lemas)
+        rows = [self.fila[lema] for lema in originales if lema in self.fila]
+        if not rows or k <= 0:
+            return {}
+
+        import numpy as np
+
+        similarities = self.vectores[rows] @ self.vectores.T
+        similarities[:, rows] = -1.0
+        top = min(k, similarities.shape[1])
+        candidates = np.argpartition(-similarities, top - 1, axis=1)[:, :top]
+
+        expansiones: dict[str, float] = {}
+        for row_index, columns in enumerate(candidates):
+            columns = sorted(
+                columns.tolist(),
+                key=lambda column: (-similarities[row_index, column], column),
+            )
+            for column in columns:
+                similarity = float(similarities[row_index, column])
+                if similarity < similitud_minima:
+                    continue
+                lema = self.lemas[column]
+                if similarity > expansiones.get(lema, 0.0):
+                    expansiones[lema] = similarity
+        return expansiones
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+from collections.abc import Collection, Iterable, Sequence
+from dataclasses import dataclass
+import os
+
+import numpy as np
+
+
+FUSION_RRF = "rrf"
+FUSION_COMBSUM = "combsum"
+FUSION_COMBMNZ = "combmnz"
+FUSION_LINEAL = "lineal"
+FUSION_METHODS = (FUSION_RRF, FUSION_COMBSUM, FUSION_COMBMNZ, FUSION_LINEAL)
+
+
+@dataclass(slots=True, frozen=True)
+class FusionConfig:
+    metodo: str = FUSION_RRF
+    profundidad_clasica: int = 8
+    profundidad_semantica: int = 8
+    rrf_k: int = 60
+    # Peso del ranking clasico en la mezcla lineal; el semantico recibe el
+    # resto. Se puede ajustar con `aprender_peso_lineal`.
+    peso_clasico: float = 0.5
+
+    def __post_init__(self) -> None:
+        if self.metodo not in FUSION_METHODS:
+            raise ValueError(
+                f"Metodo de fusion desconocido: {self.metodo}. "
+                f"Usa uno de: {', '.join(FUSION_METHODS)}."
+            )
+
+    @classmethod
+    def desde_entorno(cls) -> "FusionConfig":
+        """Configuracion por defecto sobrescrita con variables `P4_FUSION_*`."""
+        defaults = cls()
+        return cls(
+            metodo=os.getenv("P4_FUSION_METHOD", defaults.metodo).strip().lower(),
+            profundidad_clasica=int(
+                os.getenv("P4_FUSION_DEPTH_CLASSIC", defaults.profundidad_clasica)
+            ),
+            profundidad_semantica=int(
+                os.getenv("P4_FUSION_DEPTH_SEMANTIC", defaults.profundidad_semantica)
+            ),
+            rrf_k=int(os.getenv("P4_FUSION_RRF_K", defaults.rrf_k)),
+            peso_clasico=float(os.getenv("P4_FUSION_WEIGHT", defaults.peso_clasico)),
+        )
+
+
+@dataclass(slots=True)
+class RankedLeg:
+    """Un ranking de entrada como arrays: ids (enteros) y scores en orden."""
+
+    ids: np.ndarray
+    scores: np.ndarray
+
+    @classmethod
+    def desde_pares(cls, pares: Sequence[tuple[float, int]]) -> "RankedLeg":
+        if not pares:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        scores, ids = zip(*pares)
+        return cls(
+            np.asarray(ids, dtype=np.int64), np.asarray(scores, dtype=np.float64)
+        )
+
+
+@dataclass(slots=True)
+class FusedRanking:
+    ids: np.ndarray
+    scores: np.ndarray
+    # Score original de cada pierna para cada id fusionado (0 si no aparece),
+    # con forma (n_piernas, n_ids).
+    leg_scores: np.ndarray
+
+
+def fusionar(legs: Sequence[RankedLeg], config: FusionConfig) -> FusedRanking:
+    """Fusiona varios rankings en uno solo segun `config.metodo`.
+
+    Todo se calcula sobre arrays de la union de ids. Los empates se resuelven
+    por orden de primera aparicion (primero la pierna 0, luego la 1...).
+    """
+    if not legs or all(leg.ids.size == 0 for leg in legs):
+        empty = np.empty(0, dtype=np.float64)
+        return FusedRanking(
+            np.empty(0, dtype=np.int64), empty, np.zeros((len(legs), 0))
+        )
+
+    all_ids = np.concatenate([leg.ids for leg in legs])
+    unique_ids, first_index, inverse = np.unique(
+        all_ids, return_index=True, return_inverse=True
+    )
+
+    n_ids = unique_ids.size
+    present = np.zeros((len(legs), n_ids), dtype=bool)
+    ranks = np.zeros((len(legs), n_ids), dtype=np.float64)
+    raw = np.zeros((len(legs), n_ids), dtype=np.float64)
+    normalized = np.zeros((len(legs), n_ids), dtype=np.float64)
+
+    offset = 0
+    for leg_index, leg in enumerate(legs):
+        columns = inverse[offset : offset + leg.ids.size]
+        offset += leg.ids.size
+        present[leg_index, columns] = True
+        ranks[leg_index, columns] = np.arange(1, leg.ids.size + 1)
+        raw[leg_index, columns] = leg.scores
+        normalized[leg_index, columns] = _normalizar_min_max(leg.scores)
+
+    if config.metodo == FUSION_RRF:
+        contributions = np.where(present, 1.0 / (config.rrf_k + ranks), 0.0)
+        fused = contributions.sum(axis=0)
+    elif config.metodo == FUSION_COMBSUM:
+        fused = normalized.sum(axis=0)
+    elif config.metodo == FUSION_COMBMNZ:
+        fused = normalized.sum(axis=0) * present.sum(axis=0)
+    else:
+        weights = _pesos_lineales(config.peso_clasico, len(legs))
+        fused = weights @ normalized
+
+    order = np.lexsort((first_index, -fused))
+    return FusedRanking(unique_ids[order], fused[order], raw[:, order])
+
+
+def aprender_peso_lineal(
+    ejemplos: Iterable[tuple[RankedLeg, RankedLeg, Collection[int]]],
+    candidatos: Sequence[float] | None = None,
+    profundidad: int = 10,
+) -> float:
+    """Elige el peso clasico de la mezcla lineal que maximiza el MRR.
+
+    `ejemplos` son tuplas (pierna clasica, pierna semantica, ids relevantes)
+    de consultas etiquetadas. Se prueba una rejilla de pesos en [0, 1].
+    """
+    ejemplos = list(ejemplos)
+    if not ejemplos:
+        return FusionConfig().peso_clasico
+
+    grid = np.linspace(0.0, 1.0, 21).round(2) if candidatos is None else candidatos
+    best_weight = FusionConfig().peso_clasico
+    best_mrr = -1.0
+    for weight in grid:
+        config = FusionConfig(metodo=FUSION_LINEAL, peso_clasico=float(weight))
+        total = 0.0
+        for clasica, semantica, relevantes in ejemplos:
+            fused = fusionar([clasica, semantica], config)
+            for rank, chunk_id in enumerate(fused.ids[:profundidad].tolist(), 1):
+                if chunk_id in relevantes:
+                    total += 1.0 / rank
+                    break
+        mrr = total / len(ejemplos)
+        if mrr > best_mrr:
+            best_mrr = mrr
+            best_weight = float(weight)
+    return best_weight
+
+
+def _normalizar_min_max(scores: np.ndarray) -> np.ndarray:
+    if scores.size == 0:
+        return scores
+    low = scores.min()
+    span = scores.max() - low
+    if span == 0:
+        return np.ones_like(scores)
+    return (scores - low) / span
+
+
+def _pesos_lineales(peso_clasico: float, n_legs: int) -> np.ndarray:
+    if n_legs == 1:
+        return np.ones(1)
+    rest = (1.0 - peso_clasico) / (n_legs - 1)
+    return np.array([peso_clasico] + [rest] * (n_legs - 1))
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+from pathlib import Path
+
+from src.preprocessing import QuijoteIndex
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ETIQUETAS_POR_DEFECTO = PROJECT_ROOT / "eval" / "consultas_quijote.jsonl"
+
+
+@dataclass(slots=True, frozen=True)
+class ConsultaEtiquetada:
+    """Una consulta y los fragmentos literales del corpus que la responden.
+
+    Las etiquetas no apuntan a ids de chunk, que cambian con la estrategia
+    de chunking, sino a texto: un chunk es relevante si contiene alguno de
+    los fragmentos.
+    """
+
+    consulta: str
+    fragmentos: tuple[str, ...]
+
+
+def cargar_etiquetas(path: Path = ETIQUETAS_POR_DEFECTO) -> list[ConsultaEtiquetada]:
+    """Lee un JSONL con objetos `{"consulta": ..., "fragmentos": [...]}`."""
+    etiquetas: list[ConsultaEtiquetada] = []
+    for numero, linea in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+        if not linea.strip():
+            continue
+        data = json.loads(linea)
+        fragmentos = tuple(data.get("fragmentos", ()))
+        if not data.get("consulta") or not fragmentos:
+            raise ValueError(
+                f"{path.name}:{numero}: cada linea necesita 'consulta' y 'fragmentos'."
+            )
+        etiquetas.append(ConsultaEtiquetada(data["consulta"], fragmentos))
+    return etiquetas
+
+
+def normalizar_texto(texto: str) -> str:
+    return " ".join(texto.split()).lower()
+
+
+def localizar_fragmentos(
+    index: QuijoteIndex, etiquetas: list[ConsultaEtiquetada]
+) -> list[list[frozenset[int]]]:
+    """Para cada consulta y cada fragmento, ids de los chunks que lo contienen.
+
+    Un fragmento sin chunks ha quedado partido entre dos chunks sin solape
+    suficiente: no lo puede recuperar ningun resultado.
+    """
+    textos = [(chunk.chunk_id, normalizar_texto(chunk.texto)) for chunk in index.chunks]
+    return [
+        [
+            frozenset(
+                chunk_id
+                for chunk_id, texto in textos
+                if normalizar_texto(fragmento) in texto
+            )
+            for fragmento in etiqueta.fragmentos
+        ]
+        for etiqueta in etiquetas
+    ]
@@ -1 +1,9 @@
-"""Search mode modules for the Quijote TUI."""
+"""Search mode modules for the Quijote TUI.
+
+Los identificadores de modo viven aqui para que la TUI pueda usarlos sin
+importar los modulos de cada modo (y sus dependencias) durante el arranque.
+"""
+
+MODE_CLASSIC = "classic"
+MODE_SEMANTIC = "semantic"
+MODE_RAG = "rag"
@@ -1,58 +1,361 @@
 from __future__ import annotations
 
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Collection, Iterator
+from dataclasses import dataclass
+import heapq
 import math
+import re
+from threading import Lock
 
-from src.preprocessing import ChunkRecord, QuijoteIndex, SearchResult, TextAnalysis
+from src.expansion import ExpansionConfig
+from src.modes import MODE_CLASSIC
+from src.preprocessing import QuijoteIndex, SearchResult, TextAnalysis
+from src.results import ResultCursor
 
 
-MODE_CLASSIC = "classic"
+# "molinos de viento" -> frase exacta; "molino viento"~5 -> todos los lemas
+# dentro de una ventana de 5 posiciones de token, en cualquier orden.
+_PHRASE_PATTERN = re.compile(r'"([^"]+)"(?:~(\d+))?')
 
 
-def _calcular_score_tfidf(
+@dataclass(slots=True)
+class PhraseClause:
+    lemas: list[str]
+    # Desplazamiento de cada lema respecto al primero dentro de la frase.
+    offsets: list[int]
+    # None para frase exacta; si no, ancho maximo (ultima - primera posicion).
+    ventana: int | None
+
+
+def _parsear_consulta(
+    index: QuijoteIndex, consulta: str
+) -> tuple[str, list[PhraseClause]]:
+    clauses: list[PhraseClause] = []
+    for match in _PHRASE_PATTERN.finditer(consulta):
+        lemas_posiciones = index.lemas_con_posicion(match.group(1))
+        if not lemas_posiciones:
+            continue
+        first_position = lemas_posiciones[0][1]
+        clauses.append(
+            PhraseClause(
+                lemas=[lema for lema, _ in lemas_posiciones],
+                offsets=[position - first_position for _, position in lemas_posiciones],
+                ventana=int(match.group(2)) if match.group(2) is not None else None,
+            )
+        )
+
+    # El texto de las frases tambien puntua como bolsa de lemas.
+    texto_libre = _PHRASE_PATTERN.sub(lambda match: f" {match.group(1)} ", consulta)
+    return texto_libre, clauses
+
+
+def _calcular_scores_tfidf(
     index: QuijoteIndex,
     query_analysis: TextAnalysis,
-    chunk: ChunkRecord,
-) -> float:
-    if chunk.analisis.total_terminos == 0:
-        return 0.0
-
-    score_total = 0.0
-    for lema, query_count in query_analysis.conteos.items():
-        frequency = chunk.analisis.conteos.get(lema, 0)
-        if frequency == 0:
-            continue
+    documentos: Collection[int] | None = None,
+    expansiones: dict[str, float] | None = None,
+    cache: CacheLemas | None = None,
+) -> dict[int, float]:
+    # Acumula el TF-IDF recorriendo solo las posting lists de los lemas de la
+    # consulta: los chunks sin ningun lema (o fuera del filtro) no se visitan.
+    # Los lemas expandidos suman igual pero con su peso reducido.
+    pesos = {
+        lema: 1.0 + math.log(query_count)
+        for lema, query_count in query_analysis.conteos.items()
+    }
+    extra = {
+        lema: peso for lema, peso in (expansiones or {}).items() if lema not in pesos
+    }
+    if cache is not None:
+        return cache.scores(pesos, documentos, extra)
+
+    rangos = index.rangos_documentos(documentos)
+    scores: dict[int, float] = {}
+    for lema, query_weight in (*pesos.items(), *extra.items()):
+        for position, tf_idf in _contribuciones_lema(index, lema, documentos, rangos):
+            scores[position] = scores.get(position, 0.0) + tf_idf * query_weight
+
+    return scores
+
+
+def _contribuciones_lema(
+    index: QuijoteIndex,
+    lema: str,
+    documentos: Collection[int] | None,
+    rangos: list[tuple[int, int]],
+) -> list[tuple[int, float]]:
+    """TF-IDF del lema en cada chunk que lo contiene, sin peso de consulta."""
+    idf = index.idf(lema, documentos)
+    contribuciones: list[tuple[int, float]] = []
+    for position in index.posiciones_con_lema(lema, rangos):
+        analisis = index.chunks[position].analisis
+        tf = analisis.conteos[lema] / analisis.total_terminos
+        contribuciones.append((position, tf * idf))
+    return contribuciones
+
+
+class CacheLemas:
+    """Cache incremental de la busqueda clasica sobre un indice concreto.
+
+    Pensada para la busqueda en vivo, donde cada pulsacion repite casi la
+    misma consulta. Guarda el analisis de las ultimas consultas, la
+    contribucion TF-IDF de cada lema (por filtro de documentos) y los scores
+    de los lemas de la ultima consulta: si la nueva solo anade lemas al
+    final, se parte de esos scores y solo se suman los lemas nuevos.
+
+    Los lemas de la expansion (que cambian con cada lema nuevo) no entran en
+    esa reutilizacion: se suman despues sobre una copia, desde sus
+    contribuciones cacheadas. El orden de las sumas es el mismo que sin
+    cache, asi que los scores coinciden exactamente.
+    """
+
+    def __init__(self, index: QuijoteIndex, max_entradas: int = 256) -> None:
+        self.index = index
+        self.max_entradas = max_entradas
+        self._analisis: OrderedDict[
+            str, tuple[str, list[PhraseClause], TextAnalysis]
+        ] = OrderedDict()
+        self._contribuciones: OrderedDict[
+            tuple[str, frozenset[int] | None], list[tuple[int, float]]
+        ] = OrderedDict()
+        self._ultimo: (
+            tuple[frozenset[int] | None, list[tuple[str, float]], dict[int, float]]
+            | None
+        ) = None
+        # La busqueda en vivo corre en un worker y puede solaparse con Enter.
+        self._lock = Lock()
+
+    def analizar(self, consulta: str) -> tuple[str, list[PhraseClause], TextAnalysis]:
+        with self._lock:
+            cached = self._analisis.get(consulta)
+            if cached is not None:
+                self._analisis.move_to_end(consulta)
+                return cached
+
+        texto_libre, clauses = _parsear_consulta(self.index, consulta)
+        analisis = (texto_libre, clauses, self.index.analizar_texto(texto_libre))
+        with self._lock:
+            self._guardar(self._analisis, consulta, analisis)
+        return analisis
+
+    def scores(
+        self,
+        pesos: dict[str, float],
+        documentos: Collection[int] | None,
+        expansiones: dict[str, float] | None = None,
+    ) -> dict[int, float]:
+        filtro = frozenset(documentos) if documentos is not None else None
+        items = list(pesos.items())
+        with self._lock:
+            ultimo = self._ultimo
+            rangos = self.index.rangos_documentos(documentos)
+            reutilizable = (
+                ultimo is not None
+                and ultimo[0] == filtro
+                and items[: len(ultimo[1])] == ultimo[1]
+            )
+            if reutilizable and len(items) == len(ultimo[1]):
+                scores = ultimo[2]
+            else:
+                if reutilizable:
+                    scores = dict(ultimo[2])
+                    pendientes = items[len(ultimo[1]) :]
+                else:
+                    scores = {}
+                    pendientes = items
+                self._sumar(scores, pendientes, documentos, filtro, rangos)
+                self._ultimo = (filtro, items, scores)
+            if not expansiones:
+                return scores
+
+            scores = dict(scores)
+            self._sumar(scores, expansiones.items(), documentos, filtro, rangos)
+            return scores
 
-        tf = frequency / chunk.analisis.total_terminos
-        df = index.df_global.get(lema, 0)
-        idf = math.log((1 + index.total_chunks) / (1 + df)) + 1.0
-        query_weight = 1.0 + math.log(query_count)
-        score_total += tf * idf * query_weight
+    def _sumar(
+        self,
+        scores: dict[int, float],
+        pesos,
+        documentos: Collection[int] | None,
+        filtro: frozenset[int] | None,
+        rangos: list[tuple[int, int]],
+    ) -> None:
+        for lema, query_weight in pesos:
+            key = (lema, filtro)
+            contribuciones = self._contribuciones.get(key)
+            if contribuciones is None:
+                contribuciones = _contribuciones_lema(
+                    self.index, lema, documentos, rangos
+                )
+                self._guardar(self._contribuciones, key, contribuciones)
+            else:
+                self._contribuciones.move_to_end(key)
+            for position, tf_idf in contribuciones:
+                scores[position] = scores.get(position, 0.0) + tf_idf * query_weight
 
-    return score_total
+    def _guardar(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        if len(cache) > self.max_entradas:
+            cache.popitem(last=False)
+
+
+def _expandir_consulta(
+    index: QuijoteIndex, query_analysis: TextAnalysis, config: ExpansionConfig
+) -> dict[str, float]:
+    """Lemas del vocabulario cercanos a la consulta, con su peso reducido."""
+    if not config.activo or index.matriz_lemas is None:
+        return {}
+    vecinos = index.matriz_lemas.vecinos(
+        query_analysis.conteos, config.vecinos, config.similitud_minima
+    )
+    return {lema: config.peso * similitud for lema, similitud in vecinos.items()}
+
+
+def _coincidencias_frase(
+    index: QuijoteIndex,
+    clause: PhraseClause,
+    rangos: list[tuple[int, int]],
+) -> dict[int, int]:
+    """Chunks que cumplen la clausula y cuantas veces, via postings posicionales."""
+    postings = [index.postings.get(lema) for lema in clause.lemas]
+    if not all(postings):
+        return {}
+
+    # Se recorre la posting list mas corta y el resto se consulta con bisect.
+    pivot = min(range(len(postings)), key=lambda item: len(postings[item]))
+    matches: dict[int, int] = {}
+    for position in index.posiciones_con_lema(clause.lemas[pivot], rangos):
+        token_lists: list[tuple[int, ...]] = []
+        for lema, posting in zip(clause.lemas, postings):
+            k = bisect_left(posting, position)
+            if k == len(posting) or posting[k] != position:
+                break
+            token_lists.append(index.posiciones[lema][k])
+        else:
+            if clause.ventana is None:
+                count = _contar_frase_exacta(token_lists, clause.offsets)
+            else:
+                count = _contar_ventanas(token_lists, clause.ventana)
+            if count:
+                matches[position] = count
+
+    return matches
+
+
+def _contar_frase_exacta(token_lists: list[tuple[int, ...]], offsets: list[int]) -> int:
+    # Interseccion de listas ordenadas desplazadas al inicio de la frase.
+    starts = [token - offsets[0] for token in token_lists[0]]
+    for tokens, offset in zip(token_lists[1:], offsets[1:]):
+        shifted = [token - offset for token in tokens]
+        starts = _interseccion_ordenada(starts, shifted)
+        if not starts:
+            return 0
+    return len(starts)
+
+
+def _interseccion_ordenada(left: list[int], right: list[int]) -> list[int]:
+    result: list[int] = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] == right[j]:
+            result.append(left[i])
+            i += 1
+            j += 1
+        elif left[i] < right[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _contar_ventanas(token_lists: list[tuple[int, ...]], ventana: int) -> int:
+    # Cada rango minimo que cabe en la ventana cuenta como una coincidencia.
+    return sum(
+        1 for inicio, fin in rangos_cubrientes(token_lists) if fin - inicio <= ventana
+    )
+
+
+def rangos_cubrientes(token_lists: list[tuple[int, ...]]) -> Iterator[tuple[int, int]]:
+    """Barrido de k listas ordenadas de posiciones (no vacias).
+
+    Genera, para cada posicion en orden, el rango [inicio, fin] mas corto que
+    empieza en ella y contiene una posicion de cada lista (mientras quede
+    alguno). El minimo de todos es la ventana minima que cubre todas.
+    """
+    heap = [(tokens[0], list_index, 0) for list_index, tokens in enumerate(token_lists)]
+    heapq.heapify(heap)
+    current_max = max(tokens[0] for tokens in token_lists)
+    while True:
+        token, list_index, item_index = heapq.heappop(heap)
+        yield token, current_max
+        next_index = item_index + 1
+        tokens = token_lists[list_index]
+        if next_index == len(tokens):
+            return
+        next_token = tokens[next_index]
+        current_max = max(current_max, next_token)
+        heapq.heappush(heap, (next_token, list_index, next_index))
 
 
 def buscar(
     index: QuijoteIndex,
     consulta: str,
     limit: int | None = None,
+    documentos: Collection[int] | None = None,
 ) -> tuple[TextAnalysis, list[SearchResult]]:
-    query_analysis = index.analizar_texto(consulta)
+    query_analysis, cursor = buscar_paginado(index, consulta, documentos)
+    if limit is None:
+        return query_analysis, cursor.todos()
+    return query_analysis, cursor.siguiente_pagina(limit)
+
+
+def buscar_paginado(
+    index: QuijoteIndex,
+    consulta: str,
+    documentos: Collection[int] | None = None,
+    expansion: ExpansionConfig | None = None,
+    cache: CacheLemas | None = None,
+) -> tuple[TextAnalysis, ResultCursor]:
+    if cache is not None and cache.index is index:
+        texto_libre, clauses, query_analysis = cache.analizar(consulta)
+    else:
+        cache = None
+        texto_libre, clauses = _parsear_consulta(index, consulta)
+        query_analysis = index.analizar_texto(texto_libre)
     if not query_analysis.lemma_set:
-        return query_analysis, []
+        return query_analysis, ResultCursor.vacio()
 
-    resultados: list[SearchResult] = []
-    for chunk in index.chunks:
-        score = _calcular_score_tfidf(index, query_analysis, chunk)
-        if score <= 0:
-            continue
-        resultados.append(
-            SearchResult(
-                chunk=chunk,
-                score=score,
-                modo=MODE_CLASSIC,
-                clasico_score=score,
-            )
+    expansiones = _expandir_consulta(
+        index, query_analysis, expansion or ExpansionConfig.desde_entorno()
+    )
+    scores = _calcular_scores_tfidf(
+        index, query_analysis, documentos, expansiones, cache
+    )
+    if clauses:
+        rangos = index.rangos_documentos(documentos)
+        for clause in clauses:
+            matches = _coincidencias_frase(index, clause, rangos)
+            # Las clausulas de frase/proximidad son obligatorias; cada
+            # coincidencia suma como un termino mas con el IDF de sus lemas.
+            clause_idf = sum(index.idf(lema, documentos) for lema in clause.lemas)
+            scores = {
+                position: score
+                + matches[position]
+                / index.chunks[position].analisis.total_terminos
+                * clause_idf
+                for position, score in scores.items()
+                if position in matches
+            }
+
+    def crear_resultado(position: int, score: float) -> SearchResult:
+        return SearchResult(
+            chunk=index.chunks[position],
+            score=score,
+            modo=MODE_CLASSIC,
+            clasico_score=score,
         )
 
-    resultados.sort(key=lambda item: item.score, reverse=True)
-    return query_analysis, resultados if limit is None else resultados[:limit]
+    candidatos = [(score, position) for position, score in scores.items() if score > 0]
+    return query_analysis, ResultCursor(candidatos, crear_resultado)
@@ -1,25 +1,72 @@
 from __future__ import annotations
 
-from collections import defaultdict
+from collections.abc import Collection
 from typing import Iterable
 
-from src.modes.classic_mode import buscar as buscar_clasico
+from src.fusion import FusedRanking, FusionConfig, RankedLeg, fusionar
+from src.modes import MODE_RAG
+from src.modes.classic_mode import buscar_paginado as buscar_clasico
 from src.preprocessing import ChunkRecord, QuijoteIndex, SearchResult, TextAnalysis
-from src.modes.semantic_mode import buscar as buscar_semantico
+from src.modes.semantic_mode import buscar_paginado as buscar_semantico
+from src.reranker import RerankConfig, reordenar
 
 
-MODE_RAG = "rag"
+# Pasajes fusionados que se devuelven si no se indica `output_limit` y el
+# reordenado esta desactivado.
+SALIDA_POR_DEFECTO = 6
 
 
 def recuperar_contexto(
     index: QuijoteIndex,
     consulta: str,
-    retrieval_limit: int = 8,
-    output_limit: int = 6,
+    retrieval_limit: int | None = None,
+    output_limit: int | None = None,
+    documentos: Collection[int] | None = None,
+    fusion_config: FusionConfig | None = None,
+    rerank_config: RerankConfig | None = None,
 ) -> tuple[TextAnalysis, list[SearchResult], list[SearchResult], list[SearchResult]]:
-    query_analysis, clasicos = buscar_clasico(index, consulta, retrieval_limit)
-    _, semanticos = buscar_semantico(index, consulta, retrieval_limit)
-    fusion = fusionar_resultados(clasicos, semanticos, output_limit)
+    """Recupera candidatos clasicos y semanticos y los fusiona.
+
+    La profundidad de cada pierna sale de `fusion_config` (o de
+    `retrieval_limit` para ambas, si se indica). Las piernas se leen del
+    cursor de cada modo como pares (score, posicion), sin crear resultados.
+    Si el reordenado esta activo, se reordenan los mejores fusionados (y no
+    se devuelven mas de `rerank_config.candidatos`).
+
+    Sin `output_limit` se devuelven `rerank_config.salida` pasajes con el
+    reordenado activo y `SALIDA_POR_DEFECTO` sin el; un `output_limit`
+    explicito se respeta siempre, para poder comparar modos a igual `k`.
+    """
+    config = fusion_config or FusionConfig.desde_entorno()
+    if retrieval_limit is not None:
+        config = FusionConfig(
+            metodo=config.metodo,
+            profundidad_clasica=retrieval_limit,
+            profundidad_semantica=retrieval_limit,
+            rrf_k=config.rrf_k,
+            peso_clasico=config.peso_clasico,
+        )
+
+    query_analysis, cursor_clasico = buscar_clasico(index, consulta, documentos)
+    _, cursor_semantico = buscar_semantico(index, consulta, documentos)
+
+    fused = fusionar(
+        [
+            RankedLeg.desde_pares(cursor_clasico.mejores(config.profundidad_clasica)),
+            RankedLeg.desde_pares(
+                cursor_semantico.mejores(config.profundidad_semantica)
+            ),
+        ],
+        config,
+    )
+    rerank = rerank_config or RerankConfig.desde_entorno()
+    if rerank.activo:
+        fused = reordenar(index, query_analysis, fused, rerank, documentos)
+    if output_limit is None:
+        output_limit = rerank.salida if rerank.activo else SALIDA_POR_DEFECTO
+    fusion = _crear_resultados_fusion(fused, index.chunks, output_limit)
+    clasicos = cursor_clasico.siguiente_pagina(config.profundidad_clasica)
+    semanticos = cursor_semantico.siguiente_pagina(config.profundidad_semantica)
     return query_analysis, fusion, clasicos, semanticos
 
 
@@ -27,41 +74,43 @@ def fusionar_resultados(
     clasicos: Iterable[SearchResult],
     semanticos: Iterable[SearchResult],
     output_limit: int,
+    fusion_config: FusionConfig | None = None,
 ) -> list[SearchResult]:
-    fusion: dict[int, dict[str, object]] = defaultdict(
-        lambda: {"chunk": None, "rrf": 0.0, "clasico": 0.0, "semantico": 0.0}
-    )
-
-    for rank, result in enumerate(clasicos, start=1):
-        data = fusion[result.chunk.chunk_id]
-        data["chunk"] = result.chunk
-        data["rrf"] = float(data["rrf"]) + (1.0 / (60 + rank))
-        data["clasico"] = result.score
-
-    for rank, result in enumerate(semanticos, start=1):
-        data = fusion[result.chunk.chunk_id]
-        data["chunk"] = result.chunk
-        data["rrf"] = float(data["rrf"]) + (1.0 / (60 + rank))
-        data["semantico"] = result.score
-
-    resultados: list[SearchResult] = []
-    for data in fusion.values():
-        chunk = data["chunk"]
-        if not isinstance(chunk, ChunkRecord):
-            continue
-
-        resultados.append(
-            SearchResult(
-                chunk=chunk,
-                score=float(data["rrf"]),
-                modo=MODE_RAG,
-                clasico_score=float(data["clasico"]),
-                semantico_score=float(data["semantico"]),
-            )
+    """Fusiona dos listas de resultados ya construidas (por `chunk_id`)."""
+    chunks_by_id: dict[int, ChunkRecord] = {}
+    legs: list[RankedLeg] = []
+    for resultados in (clasicos, semanticos):
+        pares: list[tuple[float, int]] = []
+        for result in resultados:
+            chunks_by_id[result.chunk.chunk_id] = result.chunk
+            pares.append((result.score, result.chunk.chunk_id))
+        legs.append(RankedLeg.desde_pares(pares))
+
+    fused = fusionar(legs, fusion_config or FusionConfig())
+    return _crear_resultados_fusion(fused, chunks_by_id, output_limit)
+
+
+def _crear_resultados_fusion(
+    fused: FusedRanking,
+    chunks: list[ChunkRecord] | dict[int, ChunkRecord],
+    output_limit: int,
+) -> list[SearchResult]:
+    ids = fused.ids[:output_limit].tolist()
+    scores = fused.scores[:output_limit].tolist()
+    clasico_scores = fused.leg_scores[0, :output_limit].tolist()
+    semantico_scores = fused.leg_scores[1, :output_limit].tolist()
+    return [
+        SearchResult(
+            chunk=chunks[chunk_key],
+            score=score,
+            modo=MODE_RAG,
+            clasico_score=clasico_score,
+            semantico_score=semantico_score,
         )
-
-    resultados.sort(key=lambda item: item.score, reverse=True)
-    return resultados[:output_limit]
+        for chunk_key, score, clasico_score, semantico_score in zip(
+            ids, scores, clasico_scores, semantico_scores
+        )
+    ]
 
 
 def generar_respuesta_ollama(
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from src.preprocessing import QuijoteIndex, SearchResult, TextAnalysis
-
+from collections.abc import Collection
 
-MODE_SEMANTIC = "semantic"
+from src.modes import MODE_SEMANTIC
+from src.preprocessing import QuijoteIndex, SearchResult, TextAnalysis
+from src.results import ResultCursor
 
 
 def _cosine_similarity(
@@ -22,13 +23,26 @@ def buscar(
     index: QuijoteIndex,
     consulta: str,
     limit: int | None = None,
+    documentos: Collection[int] | None = None,
 ) -> tuple[TextAnalysis, list[SearchResult]]:
+    query_analysis, cursor = buscar_paginado(index, consulta, documentos)
+    if limit is None:
+        return query_analysis, cursor.todos()
+    return query_analysis, cursor.siguiente_pagina(limit)
+
+
+def buscar_paginado(
+    index: QuijoteIndex,
+    consulta: str,
+    documentos: Collection[int] | None = None,
+) -> tuple[TextAnalysis, ResultCursor]:
     query_analysis = index.analizar_texto(consulta)
     if query_analysis.embedding_norm == 0:
-        return query_analysis, []
+        return query_analysis, ResultCursor.vacio()
 
-    resultados: list[SearchResult] = []
-    for chunk in index.chunks:
+    candidatos: list[tuple[float, int]] = []
+    for position in index.iterar_posiciones(index.rangos_documentos(documentos)):
+        chunk = index.chunks[position]
         if chunk.analisis.embedding_norm == 0:
             continue
 
@@ -40,15 +54,14 @@ def buscar(
         )
         if score <= 0:
             continue
+        candidatos.append((score, position))
 
-        resultados.append(
-            SearchResult(
-                chunk=chunk,
-                score=score,
-                modo=MODE_SEMANTIC,
-                semantico_score=score,
-            )
+    def crear_resultado(position: int, score: float) -> SearchResult:
+        return SearchResult(
+            chunk=index.chunks[position],
+            score=score,
+            modo=MODE_SEMANTIC,
+            semantico_score=score,
         )
 
-    resultados.sort(key=lambda item: item.score, reverse=True)
-    return query_analysis, resultados if limit is None else resultados[:limit]
+    return query_analysis, ResultCursor(candidatos, crear_resultado)
@@ -1,57 +1,92 @@
 from __future__ import annotations
 
+from collections.abc import Collection
 from dataclasses import dataclass
 
-from src.modes.classic_mode import MODE_CLASSIC, buscar as buscar_clasico
-from src.modes.rag_mode import MODE_RAG, recuperar_contexto
-from src.modes.semantic_mode import MODE_SEMANTIC, buscar as buscar_semantico
+from src.modes import MODE_CLASSIC, MODE_RAG, MODE_SEMANTIC
+from src.modes.classic_mode import CacheLemas
+from src.modes.classic_mode import buscar_paginado as buscar_clasico
+from src.modes.semantic_mode import buscar_paginado as buscar_semantico
 from src.preprocessing import QuijoteIndex, SearchResult, TextAnalysis
+from src.results import ResultCursor
+
+
+DOCUMENT_FILTER_PREFIX = "doc:"
 
 
 @dataclass(slots=True)
 class SearchExecution:
     mode: str
     query_analysis: TextAnalysis
+    # Primera pagina para la barra lateral; el resto se pide a `results`.
     sidebar_results: list[SearchResult]
-    mode_results: list[SearchResult]
+    results: ResultCursor
     rag_classic_results: list[SearchResult]
     rag_semantic_results: list[SearchResult]
 
 
+def separar_filtro_documentos(consulta: str) -> tuple[str, frozenset[int] | None]:
+    """Separa un prefijo `doc:1,3` de la consulta.
+
+    Devuelve la consulta sin el prefijo y los ids de documento a los que
+    restringir la busqueda (`None` si no hay filtro).
+    """
+    head, _, rest = consulta.strip().partition(" ")
+    if not head.lower().startswith(DOCUMENT_FILTER_PREFIX):
+        return consulta.strip(), None
+
+    raw_ids = head[len(DOCUMENT_FILTER_PREFIX) :].split(",")
+    try:
+        documentos = frozenset(int(raw_id) for raw_id in raw_ids if raw_id)
+    except ValueError:
+        return consulta.strip(), None
+    return rest.strip(), documentos or None
+
+
 def orquestar_busqueda(
     index: QuijoteIndex,
     selected_mode: str,
     consulta: str,
     display_limit: int,
+    documentos: Collection[int] | None = None,
+    cache_clasica: CacheLemas | None = None,
 ) -> SearchExecution:
     if selected_mode == MODE_CLASSIC:
-        query_analysis, resultados = buscar_clasico(index, consulta)
+        query_analysis, cursor = buscar_clasico(
+            index, consulta, documentos, cache=cache_clasica
+        )
         return SearchExecution(
             mode=MODE_CLASSIC,
             query_analysis=query_analysis,
-            sidebar_results=resultados[:display_limit],
-            mode_results=resultados,
+            sidebar_results=cursor.siguiente_pagina(display_limit),
+            results=cursor,
             rag_classic_results=[],
             rag_semantic_results=[],
         )
 
     if selected_mode == MODE_SEMANTIC:
-        query_analysis, resultados = buscar_semantico(index, consulta)
+        query_analysis, cursor = buscar_semantico(index, consulta, documentos)
         return SearchExecution(
             mode=MODE_SEMANTIC,
             query_analysis=query_analysis,
-            sidebar_results=resultados[:display_limit],
-            mode_results=resultados,
+            sidebar_results=cursor.siguiente_pagina(display_limit),
+            results=cursor,
             rag_classic_results=[],
             rag_semantic_results=[],
         )
 
-    query_analysis, fusion, clasicos, semanticos = recuperar_contexto(index, consulta)
+    # El modo RAG solo se importa si llega a usarse.
+    from src.modes.rag_mode import recuperar_contexto
+
+    query_analysis, fusion, clasicos, semanticos = recuperar_contexto(
+        index, consulta, documentos=documentos
+    )
+    cursor = ResultCursor.desde_resultados(fusion)
     return SearchExecution(
         mode=MODE_RAG,
         query_analysis=query_analysis,
-        sidebar_results=fusion,
-        mode_results=fusion,
+        sidebar_results=cursor.siguiente_pagina(display_limit),
+        results=cursor,
         rag_classic_results=clasicos,
         rag_semantic_results=semanticos,
     )
@@ -1,12 +1,25 @@
 from __future__ import annotations
 
+from bisect import bisect_left
 from collections import Counter
-from collections.abc import Callable
+from collections.abc import Callable, Collection, Iterator
 from dataclasses import dataclass
 import math
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from bs4 import BeautifulSoup
+from src.chunking import Chunker, VentanaPalabras, crear_chunker
+from src.corpus import CorpusBuffer
+from src.snapshot import SnapshotError, describir_modelo, es_snapshot, leer_snapshot
+
+if TYPE_CHECKING:
+    from src.expansion import MatrizLemas
+
+
+SPACY_MODEL = "es_core_news_lg"
+# Numero aproximado de avisos de progreso por fase con contador: el resto de
+# chunks no llama a `on_progress` ni crea objetos.
+PROGRESS_UPDATES_PER_STAGE = 200
 
 
 @dataclass(slots=True)
@@ -25,10 +38,39 @@ class TextAnalysis:
 @dataclass(slots=True)
 class ChunkRecord:
     chunk_id: int
+    doc_id: int
     titulo: str
     seccion: str
-    texto: str
     analisis: TextAnalysis
+    # El texto no se guarda como str: es el tramo [inicio, fin) de bytes del
+    # bloque `bloque` (su seccion) en el buffer compartido del corpus.
+    corpus: CorpusBuffer
+    bloque: int
+    inicio: int
+    fin: int
+
+    @property
+    def texto(self) -> str:
+        return self.corpus.fragmento(self.bloque, self.inicio, self.fin)
+
+
+@dataclass(slots=True)
+class DocumentRecord:
+    doc_id: int
+    path: Path
+    total_sections: int
+    # Posiciones [inicio, fin) de sus chunks dentro de QuijoteIndex.chunks:
+    # los chunks de un documento son siempre contiguos.
+    inicio: int
+    fin: int
+
+    @property
+    def nombre(self) -> str:
+        return self.path.name
+
+    @property
+    def total_chunks(self) -> int:
+        return self.fin - self.inicio
 
 
 @dataclass(slots=True)
@@ -47,6 +89,7 @@ class _DocFeatures:
     lemma_set: frozenset[str]
     vector_sums: dict[str, list[float]]
     vector_counts: Counter[str]
+    posiciones: dict[str, list[int]]
 
 
 class IndexingCancelled(RuntimeError):
@@ -60,16 +103,47 @@ class IndexProgress:
     total: int | None = None
 
 
+def cargar_modelo_nlp(nombre: str = SPACY_MODEL):
+    import spacy
+
+    nlp = spacy.load(nombre)
+    # La primera llamada al pipeline inicializa perezosamente algunas tablas;
+    # la hacemos aqui para que no la pague la primera consulta real.
+    nlp("Precarga del modelo")
+    return nlp
+
+
 class QuijoteIndex:
     def __init__(
-        self, nlp, chunk_size_words: int = 180, chunk_overlap_words: int = 45
+        self,
+        nlp,
+        chunk_size_words: int = 180,
+        chunk_overlap_words: int = 45,
+        comprimir_textos: bool = False,
+        chunker: Chunker | None = None,
     ) -> None:
         self.nlp = nlp
         self.chunk_size_words = chunk_size_words
         self.chunk_overlap_words = chunk_overlap_words
+        # Por defecto, ventanas de `chunk_size_words` con su solape.
+        self.chunker = chunker or VentanaPalabras(chunk_size_words, chunk_overlap_words)
+        self.comprimir_textos = comprimir_textos
+        self.corpus = CorpusBuffer(comprimir_textos)
         self.chunks: list[ChunkRecord] = []
         self.chunk_by_id: dict[int, ChunkRecord] = {}
+        self.documentos: list[DocumentRecord] = []
         self.df_global: Counter[str] = Counter()
+        self.df_por_documento: dict[int, Counter[str]] = {}
+        # lema -> posiciones (ordenadas) en self.chunks de los chunks que lo
+        # contienen. Al estar los documentos en rangos contiguos, filtrar por
+        # documento es recortar cada lista con bisect.
+        self.postings: dict[str, list[int]] = {}
+        # Posting list posicional, paralela a `postings`: para el k-esimo chunk
+        # de postings[lema], posiciones[lema][k] son los indices de token
+        # (token.i en el doc de spaCy) donde aparece el lema, en orden.
+        self.posiciones: dict[str, list[tuple[int, ...]]] = {}
+        # Vectores de los lemas del vocabulario para expandir consultas.
+        self.matriz_lemas: MatrizLemas | None = None
         self._idf_cache: dict[str, float] = {}
         self.total_chunks = 0
         self.total_sections = 0
@@ -80,12 +154,47 @@ class QuijoteIndex:
         on_progress: Callable[[IndexProgress], None] | None = None,
         should_cancel: Callable[[], bool] | None = None,
     ) -> dict[str, int]:
-        self._check_cancelled(should_cancel)
-        self._emit_progress(on_progress, "Parseando HTML y creando chunks")
+        return self.cargar_archivos([path], on_progress, should_cancel)
+
+    def cargar_archivos(
+        self,
+        paths: list[Path],
+        on_progress: Callable[[IndexProgress], None] | None = None,
+        should_cancel: Callable[[], bool] | None = None,
+    ) -> dict[str, int]:
+        if len(paths) == 1 and es_snapshot(paths[0]):
+            return self.cargar_snapshot(paths[0], on_progress, should_cancel)
+
+        raw_chunks: list[dict[str, object]] = []
+        documentos: list[DocumentRecord] = []
+        corpus = CorpusBuffer(self.comprimir_textos)
+        for doc_id, path in enumerate(paths, start=1):
+            self._check_cancelled(should_cancel)
+            self._emit_progress(
+                on_progress,
+                f"Parseando HTML y creando chunks ({doc_id}/{len(paths)}): {path.name}",
+            )
+
+            html = path.read_text(encoding="utf-8")
+            sections = self._extraer_secciones(html)
+            doc_chunks = self._trocear_secciones(
+                sections, corpus, doc_id, first_chunk_id=len(raw_chunks) + 1
+            )
+            if not doc_chunks:
+                raise ValueError(
+                    f"No se pudieron extraer pasajes utiles del HTML {path.name}."
+                )
 
-        html = path.read_text(encoding="utf-8")
-        sections = self._extraer_secciones(html)
-        raw_chunks = self._trocear_secciones(sections)
+            documentos.append(
+                DocumentRecord(
+                    doc_id=doc_id,
+                    path=path,
+                    total_sections=len(sections),
+                    inicio=len(raw_chunks),
+                    fin=len(raw_chunks) + len(doc_chunks),
+                )
+            )
+            raw_chunks.extend(doc_chunks)
         self._check_cancelled(should_cancel)
 
         if not raw_chunks:
@@ -93,7 +202,13 @@ class QuijoteIndex:
 
         self.chunks.clear()
         self.chunk_by_id.clear()
+        self.corpus = corpus
+        self.documentos = documentos
         self.df_global.clear()
+        self.df_por_documento = {doc.doc_id: Counter() for doc in documentos}
+        self.postings.clear()
+        self.posiciones.clear()
+        self.matriz_lemas = None
         self._idf_cache.clear()
 
         features_by_chunk: list[_DocFeatures] = []
@@ -103,15 +218,17 @@ class QuijoteIndex:
         docs = self.nlp.pipe(
             (str(raw_chunk["texto"]) for raw_chunk in raw_chunks), batch_size=32
         )
-        for processed, doc in enumerate(docs, start=1):
+        for processed, (raw_chunk, doc) in enumerate(zip(raw_chunks, docs), start=1):
             self._check_cancelled(should_cancel)
             features = self._extraer_features_doc(doc)
             features_by_chunk.append(features)
+            df_documento = self.df_por_documento[int(raw_chunk["doc_id"])]
             for lema in features.lemma_set:
                 self.df_global[lema] += 1
+                df_documento[lema] += 1
             self._emit_progress(on_progress, analyze_stage, processed, total_chunks)
 
-        self.total_sections = len(sections)
+        self.total_sections = sum(doc.total_sections for doc in documentos)
         self.total_chunks = len(raw_chunks)
         self._idf_cache.clear()
 
@@ -122,17 +239,219 @@ class QuijoteIndex:
             analisis = self._construir_analisis(features)
             record = ChunkRecord(
                 chunk_id=int(raw_chunk["chunk_id"]),
+                doc_id=int(raw_chunk["doc_id"]),
                 titulo=str(raw_chunk["titulo"]),
                 seccion=str(raw_chunk["seccion"]),
-                texto=str(raw_chunk["texto"]),
                 analisis=analisis,
+                corpus=corpus,
+                bloque=int(raw_chunk["bloque"]),
+                inicio=int(raw_chunk["inicio"]),
+                fin=int(raw_chunk["fin"]),
             )
+            position = len(self.chunks)
+            for lema, token_positions in features.posiciones.items():
+                self.postings.setdefault(lema, []).append(position)
+                self.posiciones.setdefault(lema, []).append(tuple(token_positions))
             self.chunks.append(record)
             self.chunk_by_id[record.chunk_id] = record
             self._emit_progress(on_progress, build_stage, processed, total_chunks)
 
         self._check_cancelled(should_cancel)
-        return {"sections": self.total_sections, "chunks": self.total_chunks}
+        self._construir_matriz_lemas(on_progress)
+        return self._estadisticas()
+
+    def cargar_snapshot(
+        self,
+        path: Path,
+        on_progress: Callable[[IndexProgress], None] | None = None,
+        should_cancel: Callable[[], bool] | None = None,
+    ) -> dict[str, int]:
+        """Restaura un indice exportado con `src.snapshot.exportar_indice`.
+
+        No analiza ningun texto con spaCy; el modelo solo se usa para comprobar
+        que es el mismo con el que se construyo, porque las consultas se
+        seguiran analizando con el.
+        """
+        self._emit_progress(on_progress, f"Leyendo snapshot: {path.name}")
+        header, embeddings = leer_snapshot(path)
+        metadata = header["metadata"]
+        modelo = describir_modelo(self.nlp)
+        if metadata["modelo"] != modelo:
+            raise SnapshotError(
+                f"El snapshot se creo con {metadata['modelo']} y el modelo "
+                f"cargado es {modelo}."
+            )
+        self._check_cancelled(should_cancel)
+
+        documentos = [
+            DocumentRecord(
+                doc_id=doc["doc_id"],
+                path=Path(doc["path"]),
+                total_sections=doc["total_sections"],
+                inicio=doc["inicio"],
+                fin=doc["fin"],
+            )
+            for doc in header["documentos"]
+        ]
+        raw_chunks = header["chunks"]
+        corpus = CorpusBuffer(self.comprimir_textos)
+        for texto_bloque in header["bloques"]:
+            # Un bloque entero como un solo "parrafo" conserva sus bytes.
+            corpus.anadir_bloque([texto_bloque])
+        self.chunk_size_words = metadata["chunk_size_words"]
+        self.chunk_overlap_words = metadata["chunk_overlap_words"]
+        self.chunker = crear_chunker(
+            metadata.get("chunker", VentanaPalabras.nombre),
+            self.chunk_size_words,
+            self.chunk_overlap_words,
+        )
+        self.chunks.clear()
+        self.chunk_by_id.clear()
+        self.corpus = corpus
+        self.documentos = documentos
+        self.df_global.clear()
+        self.df_por_documento = {doc.doc_id: Counter() for doc in documentos}
+        self.postings.clear()
+        self.posiciones.clear()
+        self.matriz_lemas = None
+        self._idf_cache.clear()
+
+        # Los conteos de cada chunk salen de las postings posicionales; se
+        # ordenan por primera aparicion, como al construir el indice.
+        lemas_por_chunk: list[list[tuple[int, str, int]]] = [[] for _ in raw_chunks]
+        for lema, (posting, token_lists) in header["postings"].items():
+            self.postings[lema] = posting
+            self.posiciones[lema] = [tuple(tokens) for tokens in token_lists]
+            self.df_global[lema] = len(posting)
+            for position, tokens in zip(posting, token_lists):
+                lemas_por_chunk[position].append((tokens[0], lema, len(tokens)))
+        for doc in documentos:
+            df_documento = self.df_por_documento[doc.doc_id]
+            for lema, posting in self.postings.items():
+                df = bisect_left(posting, doc.fin) - bisect_left(posting, doc.inicio)
+                if df:
+                    df_documento[lema] = df
+
+        self.total_sections = metadata["total_sections"]
+        self.total_chunks = len(raw_chunks)
+        rows = iter(embeddings.tolist())
+        stage = f"Reconstruyendo chunks ({self.total_chunks})"
+        for processed, (raw_chunk, con_embedding) in enumerate(
+            zip(raw_chunks, header["con_embedding"]), start=1
+        ):
+            self._check_cancelled(should_cancel)
+            chunk_id, doc_id, titulo, seccion, bloque, inicio, fin = raw_chunk
+            conteos = Counter(
+                {
+                    lema: count
+                    for _, lema, count in sorted(lemas_por_chunk[processed - 1])
+                }
+            )
+            embedding = tuple(next(rows)) if con_embedding else tuple()
+            analisis = TextAnalysis(
+                conteos=conteos,
+                total_terminos=sum(conteos.values()),
+                lemma_set=frozenset(conteos.keys()),
+                embedding=embedding,
+                embedding_norm=(
+                    math.sqrt(sum(value * value for value in embedding))
+                    if embedding
+                    else 0.0
+                ),
+            )
+            record = ChunkRecord(
+                chunk_id, doc_id, titulo, seccion, analisis, corpus, bloque, inicio, fin
+            )
+            self.chunks.append(record)
+            self.chunk_by_id[record.chunk_id] = record
+            self._emit_progress(on_progress, stage, processed, self.total_chunks)
+
+        self._check_cancelled(should_cancel)
+        self._construir_matriz_lemas(on_progress)
+        return self._estadisticas()
+
+    def _construir_matriz_lemas(
+        self, on_progress: Callable[[IndexProgress], None] | None
+    ) -> None:
+        # numpy solo se carga al indexar, no al arrancar la TUI.
+        from src.expansion import MatrizLemas
+
+        self._emit_progress(on_progress, "Construyendo matriz de lemas")
+        self.matriz_lemas = MatrizLemas.construir(self.postings, self.nlp.vocab)
+
+    def _estadisticas(self) -> dict[str, int]:
+        return {
+            "documents": len(self.documentos),
+            "sections": self.total_sections,
+            "chunks": self.total_chunks,
+        }
+
+    def rangos_documentos(
+        self, documentos: Collection[int] | None = None
+    ) -> list[tuple[int, int]]:
+        """Rangos [inicio, fin) de posiciones en `chunks` para los documentos.
+
+        `None` significa todo el indice. Los rangos salen ordenados y los
+        documentos contiguos se fusionan en un unico rango.
+        """
+        if documentos is None:
+            return [(0, len(self.chunks))] if self.chunks else []
+
+        rangos: list[tuple[int, int]] = []
+        for doc in self.documentos:
+            if doc.doc_id not in documentos:
+                continue
+            if rangos and rangos[-1][1] == doc.inicio:
+                rangos[-1] = (rangos[-1][0], doc.fin)
+            else:
+                rangos.append((doc.inicio, doc.fin))
+        return rangos
+
+    def iterar_posiciones(self, rangos: list[tuple[int, int]]) -> Iterator[int]:
+        for inicio, fin in rangos:
+            yield from range(inicio, fin)
+
+    def posiciones_con_lema(
+        self, lema: str, rangos: list[tuple[int, int]]
+    ) -> Iterator[int]:
+        """Posiciones de los chunks con `lema` dentro de `rangos`.
+
+        Solo recorre los tramos de la posting list que caen en los rangos,
+        localizados con busqueda binaria.
+        """
+        posting = self.postings.get(lema)
+        if not posting:
+            return
+        for inicio, fin in rangos:
+            start = bisect_left(posting, inicio)
+            end = bisect_left(posting, fin, lo=start)
+            yield from posting[start:end]
+
+    def idf(self, lema: str, documentos: Collection[int] | None = None) -> float:
+        """IDF del lema sobre todo el indice o solo sobre `documentos`."""
+        if documentos is None:
+            return self._idf_para_lema(lema)
+
+        total_chunks = 0
+        df = 0
+        for doc in self.documentos:
+            if doc.doc_id not in documentos:
+                continue
+            total_chunks += doc.total_chunks
+            df += self.df_por_documento[doc.doc_id].get(lema, 0)
+        if total_chunks == 0:
+            return 1.0
+        return math.log((1 + total_chunks) / (1 + df)) + 1.0
+
+    def lemas_con_posicion(self, texto: str) -> list[tuple[str, int]]:
+        """Lemas indexables de `texto` con su indice de token, en orden."""
+        if not texto.strip():
+            return []
+        return [
+            (lemma, token.i)
+            for token in self.nlp(texto)
+            if (lemma := self._lema_indexable(token)) is not None
+        ]
 
     def analizar_texto(self, texto: str) -> TextAnalysis:
         if not texto.strip():
@@ -140,6 +459,8 @@ class QuijoteIndex:
         return self._construir_analisis(self._extraer_features_doc(self.nlp(texto)))
 
     def _extraer_secciones(self, html: str) -> list[tuple[str, list[str]]]:
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(html, "html.parser")
         sections: list[tuple[str, list[str]]] = []
         current_title = "Prologo / Inicio"
@@ -173,87 +494,42 @@ class QuijoteIndex:
         )
 
     def _trocear_secciones(
-        self, sections: list[tuple[str, list[str]]]
+        self,
+        sections: list[tuple[str, list[str]]],
+        corpus: CorpusBuffer,
+        doc_id: int = 1,
+        first_chunk_id: int = 1,
     ) -> list[dict[str, object]]:
         raw_chunks: list[dict[str, object]] = []
-        chunk_id = 1
+        chunk_id = first_chunk_id
 
         for title, paragraphs in sections:
-            normalized_paragraphs = self._segmentar_parrafos_largos(paragraphs)
-            chunk_texts = self._crear_chunks_desde_parrafos(normalized_paragraphs)
-            for fragment_index, chunk_text in enumerate(chunk_texts, start=1):
+            unidades, chunk_ranges = self.chunker.trocear(paragraphs)
+            if not unidades:
+                continue
+            # Cada chunk es un tramo de unidades consecutivas de la seccion, que
+            # se guarda una sola vez en el buffer del corpus.
+            bloque, tramos = corpus.anadir_bloque(unidades)
+            for fragment_index, (start, end) in enumerate(chunk_ranges, start=1):
+                inicio = tramos[start][0]
+                fin = tramos[end - 1][1]
                 raw_chunks.append(
                     {
                         "chunk_id": chunk_id,
+                        "doc_id": doc_id,
                         "titulo": f"{title} · pasaje {fragment_index}",
                         "seccion": title,
-                        "texto": chunk_text,
+                        "bloque": bloque,
+                        "inicio": inicio,
+                        "fin": fin,
+                        # Solo se usa para analizarlo; el indice no lo guarda.
+                        "texto": corpus.fragmento(bloque, inicio, fin),
                     }
                 )
                 chunk_id += 1
 
         return raw_chunks
 
-    def _segmentar_parrafos_largos(self, paragraphs: list[str]) -> list[str]:
-        normalized: list[str] = []
-        for paragraph in paragraphs:
-            words = paragraph.split()
-            if len(words) <= self.chunk_size_words:
-                normalized.append(paragraph)
-                continue
-
-            start = 0
-            while start < len(words):
-                end = min(start + self.chunk_size_words, len(words))
-                normalized.append(" ".join(words[start:end]))
-                if end >= len(words):
-                    break
-                start = max(end - self.chunk_overlap_words, start + 1)
-
-        return normalized
-
-    def _crear_chunks_desde_parrafos(self, paragraphs: list[str]) -> list[str]:
-        if not paragraphs:
-            return []
-
-        word_counts = [len(paragraph.split()) for paragraph in paragraphs]
-        chunk_texts: list[str] = []
-        start = 0
-
-        while start < len(paragraphs):
-            current_parts: list[str] = []
-            total_words = 0
-            end = start
-
-            while end < len(paragraphs):
-                paragraph_words = word_counts[end]
-                if (
-                    current_parts
-                    and total_words + paragraph_words > self.chunk_size_words
-                ):
-                    break
-                current_parts.append(paragraphs[end])
-                total_words += paragraph_words
-                end += 1
-                if total_words >= self.chunk_size_words:
-                    break
-
-            if current_parts:
-                chunk_texts.append("\n\n".join(current_parts))
-
-            if end >= len(paragraphs):
-                break
-
-            overlap_words = 0
-            next_start = end
-            while next_start > start and overlap_words < self.chunk_overlap_words:
-                next_start -= 1
-                overlap_words += word_counts[next_start]
-
-            start = end if next_start == start else next_start
-
-        return chunk_texts
-
     def _idf_para_lema(self, lema: str) -> float:
         cached = self._idf_cache.get(lema)
         if cached is not None:
@@ -271,16 +547,15 @@ class QuijoteIndex:
         conteos: Counter[str] = Counter()
         vector_sums: dict[str, list[float]] = {}
         vector_counts: Counter[str] = Counter()
+        posiciones: dict[str, list[int]] = {}
 
         for token in doc:
-            if not token.is_alpha or token.is_stop:
-                continue
-
-            lemma = token.lemma_.lower().strip()
-            if not lemma:
+            lemma = self._lema_indexable(token)
+            if lemma is None:
                 continue
 
             conteos[lemma] += 1
+            posiciones.setdefault(lemma, []).append(token.i)
 
             if token.has_vector:
                 token_vector = [float(value) for value in token.vector]
@@ -298,8 +573,15 @@ class QuijoteIndex:
             lemma_set=frozenset(conteos.keys()),
             vector_sums=vector_sums,
             vector_counts=vector_counts,
+            posiciones=posiciones,
         )
 
+    def _lema_indexable(self, token) -> str | None:
+        if not token.is_alpha or token.is_stop:
+            return None
+        lemma = token.lemma_.lower().strip()
+        return lemma or None
+
     def _construir_analisis(self, features: _DocFeatures) -> TextAnalysis:
         weighted_vector_sum: list[float] = []
         total_weight = 0.0
@@ -343,6 +625,10 @@ class QuijoteIndex:
     ) -> None:
         if on_progress is None:
             return
+        if completed is not None and total and completed < total:
+            step = max(1, total // PROGRESS_UPDATES_PER_STAGE)
+            if completed % step:
+                return
         on_progress(IndexProgress(stage=stage, completed=completed, total=total))
 
     def _check_cancelled(self, should_cancel: Callable[[], bool] | None) -> None:
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Collection
+from dataclasses import dataclass
+import os
+import time
+
+import numpy as np
+
+from src.entorno import flag_activo
+from src.fusion import FusedRanking
+from src.modes.classic_mode import rangos_cubrientes
+from src.preprocessing import QuijoteIndex, TextAnalysis
+
+
+# Peso de cada rasgo en el score final: cobertura de lemas (ponderada por
+# IDF), proximidad entre ellos y score de fusion normalizado.
+_PESOS_RASGOS = np.array([0.6, 0.3, 0.1])
+
+
+@dataclass(slots=True, frozen=True)
+class RerankConfig:
+    activo: bool = False
+    # Candidatos fusionados que se reordenan y cuantos se envian a Ollama.
+    candidatos: int = 12
+    salida: int = 3
+    # Si se agota, el resto de candidatos conserva el orden de la fusion.
+    presupuesto_ms: float = 50.0
+
+    @classmethod
+    def desde_entorno(cls) -> "RerankConfig":
+        """Configuracion por defecto sobrescrita con variables `P4_RAG_RERANK*`."""
+        defaults = cls()
+        return cls(
+            activo=flag_activo("P4_RAG_RERANK"),
+            candidatos=int(os.getenv("P4_RAG_RERANK_CANDIDATES", defaults.candidatos)),
+            salida=int(os.getenv("P4_RAG_RERANK_TOP", defaults.salida)),
+            presupuesto_ms=float(
+                os.getenv("P4_RAG_RERANK_BUDGET_MS", defaults.presupuesto_ms)
+            ),
+        )
+
+
+def reordenar(
+    index: QuijoteIndex,
+    query_analysis: TextAnalysis,
+    fused: FusedRanking,
+    config: RerankConfig,
+    documentos: Collection[int] | None = None,
+) -> FusedRanking:
+    """Reordena los mejores candidatos fusionados con rasgos lexicos locales.
+
+    Para cada candidato se mide que parte del IDF de la consulta cubren sus
+    lemas y lo juntos que aparecen (ventana minima con todos los lemas
+    presentes), usando las postings posicionales del indice: no se vuelve a
+    analizar el texto. Los rasgos se combinan en bloque con un producto
+    matricial. Los candidatos que no se llegan a puntuar dentro del
+    presupuesto quedan detras, en el orden de la fusion.
+    """
+    ids = fused.ids[: config.candidatos]
+    lemas = [lema for lema in query_analysis.conteos if lema in index.postings]
+    if ids.size == 0 or not lemas:
+        return _recortar(fused, ids.size)
+
+    idfs = np.array([index.idf(lema, documentos) for lema in lemas])
+    total_idf = idfs.sum()
+    deadline = time.perf_counter() + config.presupuesto_ms / 1000
+
+    features = np.zeros((ids.size, _PESOS_RASGOS.size))
+    features[:, 2] = _normalizar(fused.scores[: ids.size])
+    scored = 0
+    for row, position in enumerate(ids.tolist()):
+        if scored and time.perf_counter() > deadline:
+            break
+        token_lists: list[tuple[int, ...]] = []
+        matched_idf = 0.0
+        for lema, idf in zip(lemas, idfs):
+            tokens = _tokens_en_chunk(index, lema, position)
+            if tokens:
+                token_lists.append(tokens)
+                matched_idf += idf
+        features[row, 0] = matched_idf / total_idf
+        if len(token_lists) > 1:
+            features[row, 1] = (len(token_lists) - 1) / _ventana_minima(token_lists)
+        scored += 1
+
+    scores = np.zeros(ids.size)
+    scores[:scored] = features[:scored] @ _PESOS_RASGOS
+    # Orden estable: los empates (y los no puntuados) mantienen la fusion.
+    order = np.concatenate(
+        [np.argsort(-scores[:scored], kind="stable"), np.arange(scored, ids.size)]
+    )
+    return FusedRanking(ids[order], scores[order], fused.leg_scores[:, order])
+
+
+def _tokens_en_chunk(index: QuijoteIndex, lema: str, position: int) -> tuple[int, ...]:
+    posting = index.postings[lema]
+    k = bisect_left(posting, position)
+    if k == len(posting) or posting[k] != position:
+        return ()
+    return index.posiciones[lema][k]
+
+
+def _ventana_minima(token_lists: list[tuple[int, ...]]) -> int:
+    # Rango minimo de posiciones de token que contiene un token de cada lista.
+    best = min(fin - inicio for inicio, fin in rangos_cubrientes(token_lists))
+    return max(best, len(token_lists) - 1)
+
+
+def _normalizar(scores: np.ndarray) -> np.ndarray:
+    if scores.size == 0 or scores.max() == 0:
+        return np.zeros_like(scores)
+    return scores / scores.max()
+
+
+def _recortar(fused: FusedRanking, size: int) -> FusedRanking:
+    return FusedRanking(
+        fused.ids[:size], fused.scores[:size], fused.leg_scores[:, :size]
+    )
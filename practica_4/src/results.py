@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+import heapq
+
+from src.preprocessing import SearchResult
+
+
+class ResultCursor:
+    """Candidatos puntuados de una consulta, servidos por paginas bajo demanda.
+
+    Guarda los pares (score, posicion) calculados una sola vez. Si no vienen
+    ya ordenados se montan en un heap y cada pagina extrae solo los
+    siguientes mejores, asi que pedir mas resultados no repite la busqueda
+    ni ordena el resto. Los `SearchResult` se crean al servir cada pagina.
+    """
+
+    def __init__(
+        self,
+        candidatos: list[tuple[float, int]],
+        crear_resultado: Callable[[int, float], SearchResult],
+        ordenados: bool = False,
+    ) -> None:
+        self.total = len(candidatos)
+        self.servidos: list[SearchResult] = []
+        self._crear_resultado = crear_resultado
+        self._heap: list[tuple[float, int]] | None = None
+        self._ordenados: list[tuple[float, int]] = []
+        if ordenados:
+            self._ordenados = candidatos
+        else:
+            # Mismo orden que sorted(score desc, posicion asc).
+            self._heap = [(-score, position) for score, position in candidatos]
+            heapq.heapify(self._heap)
+
+    @classmethod
+    def vacio(cls) -> "ResultCursor":
+        return cls([], _sin_resultados, ordenados=True)
+
+    @classmethod
+    def desde_resultados(cls, resultados: list[SearchResult]) -> "ResultCursor":
+        """Cursor sobre una lista ya construida y ordenada (p. ej. fusion RAG)."""
+        return cls(
+            [(result.score, offset) for offset, result in enumerate(resultados)],
+            lambda offset, _score: resultados[offset],
+            ordenados=True,
+        )
+
+    @property
+    def agotado(self) -> bool:
+        return len(self.servidos) >= self.total
+
+    def siguiente_pagina(self, size: int) -> list[SearchResult]:
+        start = len(self.servidos)
+        end = min(self.total, start + max(0, size))
+        page: list[SearchResult] = []
+        for served in range(start, end):
+            if self._heap is not None:
+                negative_score, position = heapq.heappop(self._heap)
+                score = -negative_score
+            else:
+                score, position = self._ordenados[served]
+            page.append(self._crear_resultado(position, score))
+
+        self.servidos.extend(page)
+        return page
+
+    def mejores(self, n: int) -> list[tuple[float, int]]:
+        """Los `n` mejores pares (score, posicion) sin consumir el cursor."""
+        if self._heap is None:
+            return self._ordenados[:n]
+        return [
+            (-negative_score, position)
+            for negative_score, position in heapq.nsmallest(n, self._heap)
+        ]
+
+    def todos(self) -> list[SearchResult]:
+        self.siguiente_pagina(self.total - len(self.servidos))
+        return self.servidos
+
+
+def _sin_resultados(_position: int, _score: float) -> SearchResult:
+    raise IndexError("Cursor sin resultados.")
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import hashlib
+import json
+import lzma
+from pathlib import Path
+import struct
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from src.preprocessing import QuijoteIndex
+
+
+# Formato del fichero:
+#   MAGIC (8 bytes) | version (uint16) | sha256 del payload (32 bytes) | payload
+# El payload es lzma de: longitud de la cabecera JSON (uint32) | cabecera JSON
+# | embeddings de los chunks como float64 little-endian, fila a fila.
+# No se usa pickle: cargar un snapshot ajeno nunca ejecuta codigo.
+SNAPSHOT_MAGIC = b"P4INDEX\x00"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = ".p4idx"
+_PREFIX = struct.Struct(">8sH32s")
+_HEADER_LENGTH = struct.Struct(">I")
+_EMBEDDING_DTYPE = "<f8"
+
+
+class SnapshotError(ValueError):
+    """El fichero no es un snapshot valido o no es compatible."""
+
+
+def es_snapshot(path: Path) -> bool:
+    try:
+        with path.open("rb") as handle:
+            return handle.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+
+def describir_modelo(nlp) -> str:
+    meta = getattr(nlp, "meta", {}) or {}
+    return f"{meta.get('lang', '?')}_{meta.get('name', '?')}-{meta.get('version', '?')}"
+
+
+def exportar_indice(index: QuijoteIndex, path: Path) -> int:
+    """Escribe `index` en `path` como snapshot. Devuelve los bytes escritos.
+
+    Se guardan documentos, el texto de cada seccion, los chunks como tramos
+    de esas secciones, postings posicionales y embeddings. El DF y los
+    conteos por chunk se derivan de las postings al importar.
+    """
+    import numpy as np
+
+    with_embedding = [bool(chunk.analisis.embedding) for chunk in index.chunks]
+    rows = [
+        chunk.analisis.embedding for chunk in index.chunks if chunk.analisis.embedding
+    ]
+    embeddings = (
+        np.asarray(rows, dtype=_EMBEDDING_DTYPE)
+        if rows
+        else np.zeros((0, 0), dtype=_EMBEDDING_DTYPE)
+    )
+
+    header = {
+        "metadata": {
+            "version": SNAPSHOT_VERSION,
+            "creado": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "modelo": describir_modelo(index.nlp),
+            "chunk_size_words": index.chunk_size_words,
+            "chunk_overlap_words": index.chunk_overlap_words,
+            "chunker": index.chunker.nombre,
+            "total_sections": index.total_sections,
+            "total_chunks": index.total_chunks,
+            "embedding_dim": int(embeddings.shape[1]) if rows else 0,
+        },
+        "documentos": [
+            {
+                "doc_id": doc.doc_id,
+                "path": str(doc.path),
+                "total_sections": doc.total_sections,
+                "inicio": doc.inicio,
+                "fin": doc.fin,
+            }
+            for doc in index.documentos
+        ],
+        "bloques": [index.corpus.bloque(bloque) for bloque in range(len(index.corpus))],
+        "chunks": [
+            [
+                chunk.chunk_id,
+                chunk.doc_id,
+                chunk.titulo,
+                chunk.seccion,
+                chunk.bloque,
+                chunk.inicio,
+                chunk.fin,
+            ]
+            for chunk in index.chunks
+        ],
+        "con_embedding": with_embedding,
+        "postings": {
+            lema: [posting, [list(tokens) for tokens in index.posiciones[lema]]]
+            for lema, posting in index.postings.items()
+        },
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+    payload = lzma.compress(
+        _HEADER_LENGTH.pack(len(header_bytes)) + header_bytes + embeddings.tobytes()
+    )
+    digest = hashlib.sha256(payload).digest()
+
+    data = _PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, digest) + payload
+    # Se escribe a un temporal y se renombra para no dejar snapshots a medias.
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+    return len(data)
+
+
+def leer_snapshot(path: Path) -> tuple[dict[str, Any], Any]:
+    """Valida y descomprime un snapshot: devuelve la cabecera y los embeddings."""
+    import numpy as np
+
+    data = path.read_bytes()
+    if len(data) < _PREFIX.size:
+        raise SnapshotError(f"{path.name} no es un snapshot de indice.")
+    magic, version, digest = _PREFIX.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError(f"{path.name} no es un snapshot de indice.")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(
+            f"Version de snapshot {version} no soportada (se espera {SNAPSHOT_VERSION})."
+        )
+
+    payload = data[_PREFIX.size :]
+    if hashlib.sha256(payload).digest() != digest:
+        raise SnapshotError(
+            f"El checksum de {path.name} no coincide: fichero corrupto."
+        )
+
+    raw = lzma.decompress(payload)
+    (header_length,) = _HEADER_LENGTH.unpack_from(raw)
+    header_end = _HEADER_LENGTH.size + header_length
+    header = json.loads(raw[_HEADER_LENGTH.size : header_end].decode("utf-8"))
+    dim = header["metadata"]["embedding_dim"]
+    embeddings = np.frombuffer(raw, dtype=_EMBEDDING_DTYPE, offset=header_end)
+    return header, embeddings.reshape(-1, dim) if dim else embeddings.reshape(0, 0)
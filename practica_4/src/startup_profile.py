@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+import subprocess
+import sys
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+@dataclass(slots=True)
+class ImportTiming:
+    modulo: str
+    self_ms: float
+    modulos_cargados: int
+
+
+def medir_importaciones(
+    modulo: str = "src.tui",
+) -> tuple[float, list[ImportTiming]]:
+    """Importa `modulo` en un interprete limpio con `-X importtime`.
+
+    Se usa un subproceso porque en el proceso actual los modulos ya estan en
+    `sys.modules` y no se volverian a medir. Devuelve el tiempo acumulado del
+    import de `modulo` y el desglose de tiempo propio agrupado por paquete.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"No se pudo importar {modulo}: {completed.stderr.strip()[-300:]}"
+        )
+
+    self_us: dict[str, int] = defaultdict(int)
+    loaded: dict[str, int] = defaultdict(int)
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+
+        name = parts[2].strip()
+        group = _agrupar_modulo(name)
+        self_us[group] += int(parts[0])
+        loaded[group] += 1
+        if name == modulo:
+            total_us = int(parts[1])
+
+    timings = [
+        ImportTiming(
+            modulo=group, self_ms=micros / 1000, modulos_cargados=loaded[group]
+        )
+        for group, micros in self_us.items()
+    ]
+    timings.sort(key=lambda item: item.self_ms, reverse=True)
+    return total_us / 1000, timings
+
+
+def formatear_perfil(
+    total_ms: float, timings: list[ImportTiming], limite: int = 15
+) -> str:
+    lines = [
+        f"Import de la TUI: {total_ms:.1f} ms",
+        f"{'paquete':<28} {'ms':>8} {'modulos':>8}",
+    ]
+    for timing in timings[:limite]:
+        lines.append(
+            f"{timing.modulo:<28} {timing.self_ms:>8.1f} {timing.modulos_cargados:>8}"
+        )
+    remaining = timings[limite:]
+    if remaining:
+        lines.append(
+            f"{'(resto)':<28} {sum(item.self_ms for item in remaining):>8.1f} "
+            f"{sum(item.modulos_cargados for item in remaining):>8}"
+        )
+    return "\n".join(lines)
+
+
+def _agrupar_modulo(name: str) -> str:
+    # Los modulos propios se muestran por separado; los de terceros se
+    # agrupan por paquete raiz (textual, rich, asyncio...).
+    if name == "src" or name.startswith("src."):
+        return name
+    return name.split(".", 1)[0]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import argparse
 import os
 from pathlib import Path
 from threading import Lock
@@ -10,23 +11,35 @@ from textual import work
 from textual.app import App, ComposeResult
 from textual.binding import Binding
 from textual.containers import Horizontal, Vertical, VerticalScroll
+from textual.timer import Timer
 from textual.widgets import Footer, Header, Input, ListItem, ListView, Select, Static
 from textual.worker import Worker, WorkerState, get_current_worker
 
-from src.modes.classic_mode import MODE_CLASSIC
-from src.modes.rag_mode import MODE_RAG, generar_respuesta_ollama
-from src.modes.semantic_mode import MODE_SEMANTIC
-from src.orchestrator import orquestar_busqueda
+from src.chunking import chunker_desde_entorno
+from src.entorno import flag_activo
+from src.modes import MODE_CLASSIC, MODE_RAG, MODE_SEMANTIC
+from src.modes.classic_mode import CacheLemas
+from src.orchestrator import (
+    SearchExecution,
+    orquestar_busqueda,
+    separar_filtro_documentos,
+)
 from src.preprocessing import (
     IndexProgress,
     IndexingCancelled,
     QuijoteIndex,
     SearchResult,
     TextAnalysis,
+    cargar_modelo_nlp,
 )
+from src.results import ResultCursor
+from src.snapshot import SNAPSHOT_SUFFIX, exportar_indice
 from src.ui.indexing import IndexingWorkerResult, ProgressSnapshot
 from src.ui.presenters import (
     MODE_BROWSE,
+    format_model_error_status,
+    format_model_loading_status,
+    format_model_ready_status,
     format_result_metadata,
     format_sidebar_label,
     render_chunk_detail,
@@ -43,6 +56,7 @@ from src.ui.presenters import (
     render_rag_success,
     render_semantic_summary,
 )
+from src.ui.search import LiveSearchResult
 from src.ui.styles import APP_CSS
 
 
@@ -52,39 +66,71 @@ class QuijoteApp(App):
         Binding("ctrl+b", "focus_search", "Buscar"),
         Binding("ctrl+m", "focus_mode", "Modo"),
         Binding("ctrl+o", "focus_model", "Modelo"),
+        Binding("ctrl+l", "toggle_live_search", "En vivo"),
+        # Con prioridad: si no, el Input con el foco lo usa para ir al final.
+        Binding("ctrl+e", "export_index", "Exportar indice", priority=True),
         Binding("ctrl+q", "quit", "Salir"),
     ]
 
     CSS = APP_CSS
     DISPLAY_LIMIT = 20
+    # Filas restantes bajo la seleccion/scroll a partir de las que se pide la
+    # siguiente pagina de resultados.
+    SIDEBAR_PREFETCH_ROWS = 5
+    # Filas montadas como maximo en la barra lateral; al desplazarse se
+    # reutilizan con otros resultados en lugar de montar widgets nuevos.
+    SIDEBAR_MAX_ROWS = 3 * DISPLAY_LIMIT
+    # Pausa entre pulsaciones tras la que se lanza la busqueda en vivo.
+    LIVE_SEARCH_DELAY = 0.25
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
+        self.launched_at = monotonic()
+        self.first_frame_seconds: float | None = None
         self.nlp: Any | None = None
+        self.nlp_load_seconds: float | None = None
+        self.warmup_worker: Worker[Any] | None = None
+        self._nlp_lock = Lock()
         self.index: QuijoteIndex | None = None
         self.selected_mode = MODE_CLASSIC
         self.current_query = ""
         self.current_query_analysis = TextAnalysis.empty()
         self.current_results: list[SearchResult] = []
-        self.results_by_chunk_id: dict[int, SearchResult] = {}
+        self.current_cursor = ResultCursor.vacio()
+        # Filas de la barra lateral que se reutilizan entre consultas, con la
+        # clave (chunk_id, score) de lo que muestra cada una. Muestran
+        # current_results a partir de _sidebar_offset; _sidebar_seleccion es
+        # la posicion en current_results del resultado resaltado.
+        self._sidebar_rows: list[tuple[ListItem, Static]] = []
+        self._sidebar_keys: list[tuple[int, float]] = []
+        self._sidebar_offset = 0
+        self._sidebar_seleccion: int | None = None
+        self._detail_cache: tuple[tuple[Any, ...], Any] | None = None
+        self.live_search = flag_activo("P4_LIVE_SEARCH")
+        self.classic_cache: CacheLemas | None = None
+        self._live_timer: Timer | None = None
+        # Cada pulsacion (o Enter) incrementa la generacion; los resultados
+        # en vivo de una generacion anterior se descartan.
+        self._live_generation = 0
 
         self.default_rag_model = os.getenv("P4_OLLAMA_MODEL", "gemma4:e2b")
         self.default_corpus_path = Path(__file__).resolve().parent.parent / "2000-h.htm"
 
         self.index_state: Literal["idle", "loading", "ready", "error"] = "idle"
-        self.indexed_path: Path | None = None
+        self.indexed_paths: list[Path] = []
         self.active_worker: Worker[IndexingWorkerResult] | None = None
         self.active_stage = "En espera"
         self.index_start_time: float | None = None
         self.loading_notice: str | None = None
         self._index_run_id = 0
-        self._progress_lock = Lock()
+        now = monotonic()
         self._progress_snapshot = ProgressSnapshot(
             run_id=0,
             stage="En espera",
             completed=None,
             total=None,
-            updated_at=monotonic(),
+            updated_at=now,
+            stage_started_at=now,
         )
 
     def compose(self) -> ComposeResult:
@@ -146,6 +192,13 @@ class QuijoteApp(App):
 
         self._sync_model_visibility()
         self.set_interval(0.5, self._on_progress_tick)
+        self.call_after_refresh(self._registrar_primer_frame)
+        self.watch(self._sidebar(), "scroll_y", self._on_sidebar_scroll, init=False)
+        self._iniciar_precarga_modelo()
+
+    def _registrar_primer_frame(self) -> None:
+        if self.first_frame_seconds is None:
+            self.first_frame_seconds = monotonic() - self.launched_at
 
     def on_input_submitted(self, event: Input.Submitted) -> None:
         if event.input.id == "file-input":
@@ -153,17 +206,24 @@ class QuijoteApp(App):
             return
 
         if event.input.id == "search-input":
+            self._cancelar_busqueda_en_vivo()
             self.ejecutar_busqueda(event.value)
             return
 
         if event.input.id == "model-input":
             self.actualizar_modelo_ollama(event.value)
 
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id != "search-input" or not self.live_search:
+            return
+        self._programar_busqueda_en_vivo(event.value)
+
     def on_select_changed(self, event: Select.Changed) -> None:
         if event.select.id != "mode-select":
             return
 
         self.selected_mode = str(event.value)
+        self._cancelar_busqueda_en_vivo()
         self._sync_model_visibility()
         if self.index_state != "ready" or self.index is None:
             return
@@ -172,6 +232,18 @@ class QuijoteApp(App):
             self.ejecutar_busqueda(self.current_query)
 
     def on_worker_state_changed(self, event: Worker.StateChanged) -> None:
+        if self.warmup_worker is not None and event.worker is self.warmup_worker:
+            self._on_precarga_state_changed(event)
+            return
+
+        if event.worker.group == "live-search":
+            self._on_busqueda_en_vivo_state_changed(event)
+            return
+
+        if event.worker.group == "export":
+            self._on_exportacion_state_changed(event)
+            return
+
         if self.active_worker is None or event.worker is not self.active_worker:
             return
 
@@ -187,7 +259,8 @@ class QuijoteApp(App):
 
             self.nlp = result.nlp
             self.index = result.index
-            self.indexed_path = result.path
+            self.classic_cache = CacheLemas(result.index)
+            self.indexed_paths = result.paths
             self.index_state = "ready"
             self.active_stage = "Indice listo"
             self.active_worker = None
@@ -198,7 +271,7 @@ class QuijoteApp(App):
             self._mostrar_exploracion_inicial()
             self._reader().update(
                 render_index_ready(
-                    result.path,
+                    result.index.documentos,
                     result.stats,
                     result.index.chunk_size_words,
                     result.index.chunk_overlap_words,
@@ -222,58 +295,102 @@ class QuijoteApp(App):
         )
 
     def cargar_archivo(self, ruta_str: str) -> None:
-        normalized_path = ruta_str.strip() or str(self.default_corpus_path)
-        path = Path(normalized_path)
-        self._file_input().value = str(path)
+        paths = self._parsear_rutas(ruta_str)
+        self._file_input().value = "; ".join(str(path) for path in paths)
 
         was_loading = self.index_state == "loading"
         if was_loading:
             self._cancel_active_worker()
 
-        if not path.exists():
+        missing = next((path for path in paths if not path.exists()), None)
+        if missing is not None:
             if was_loading:
                 self._index_run_id += 1
             self.active_worker = None
             self.index_state = "error"
             self.index = None
-            self.indexed_path = None
+            self.indexed_paths = []
             self.active_stage = "Error"
             self.index_start_time = None
             self.loading_notice = None
             self._reset_search_state()
             self._actualizar_sidebar([])
-            self._reader().update(render_missing_file(path))
+            self._reader().update(render_missing_file(missing))
             return
 
         trigger = "manual_restart" if was_loading else "manual"
-        self._start_indexing(path, trigger)
+        self._start_indexing(paths, trigger)
+
+    def _parsear_rutas(self, rutas_str: str) -> list[Path]:
+        # Varias rutas separadas por ";" se indexan como documentos distintos.
+        paths = [Path(ruta.strip()) for ruta in rutas_str.split(";") if ruta.strip()]
+        return paths or [self.default_corpus_path]
+
+    def _iniciar_precarga_modelo(self) -> None:
+        self.sub_title = format_model_loading_status()
+        self.warmup_worker = self._precargar_modelo()
+
+    @work(thread=True, group="warmup", exit_on_error=False)
+    def _precargar_modelo(self) -> Any:
+        return self._obtener_nlp()
+
+    def _on_precarga_state_changed(self, event: Worker.StateChanged) -> None:
+        if event.state == WorkerState.SUCCESS:
+            self.warmup_worker = None
+            self.sub_title = format_model_ready_status(self.nlp_load_seconds or 0.0)
+            return
+
+        if event.state in {WorkerState.ERROR, WorkerState.CANCELLED}:
+            self.warmup_worker = None
+            error = event.worker.error
+            self.sub_title = format_model_error_status(
+                str(error) if error else "precarga cancelada"
+            )
+
+    def _obtener_nlp(self) -> Any:
+        # El worker de precarga y el de indexacion comparten el lock: quien
+        # llegue segundo espera al primero en vez de cargar el modelo otra vez.
+        with self._nlp_lock:
+            if self.nlp is None:
+                started = monotonic()
+                nlp = cargar_modelo_nlp()
+                self.nlp_load_seconds = monotonic() - started
+                self.nlp = nlp
+            return self.nlp
 
     @work(thread=True, group="indexing", exclusive=True, exit_on_error=False)
-    def _indexar_en_background(self, path: Path, run_id: int) -> IndexingWorkerResult:
+    def _indexar_en_background(
+        self, paths: list[Path], run_id: int
+    ) -> IndexingWorkerResult:
         worker = get_current_worker()
 
-        self._set_progress(run_id, "Cargando modelo spaCy", None, None)
+        warmup_worker = self.warmup_worker
+        if warmup_worker is not None and not warmup_worker.is_finished:
+            stage = "Esperando precarga del modelo spaCy"
+        else:
+            stage = "Cargando modelo spaCy"
+        self._set_progress(run_id, stage, None, None)
         if self._should_cancel(worker, run_id):
             raise IndexingCancelled("Indexacion cancelada.")
 
-        nlp = self.nlp
-        if nlp is None:
-            import spacy
-
-            nlp = spacy.load("es_core_news_lg")
+        nlp = self._obtener_nlp()
 
         if self._should_cancel(worker, run_id):
             raise IndexingCancelled("Indexacion cancelada.")
 
-        index = QuijoteIndex(nlp)
+        index = QuijoteIndex(
+            nlp,
+            comprimir_textos=flag_activo("P4_COMPRESS_TEXTS"),
+            chunker=chunker_desde_entorno(),
+        )
 
         def on_progress(progress: IndexProgress) -> None:
             self._set_progress(
                 run_id, progress.stage, progress.completed, progress.total
             )
 
-        stats = index.cargar_archivo(
-            path,
+        stats = index.cargar_archivos(
+            paths,
             on_progress=on_progress,
             should_cancel=lambda: self._should_cancel(worker, run_id),
         )
@@ -283,19 +400,19 @@ class QuijoteApp(App):
 
         return IndexingWorkerResult(
             run_id=run_id,
-            path=path,
+            paths=paths,
             stats=stats,
             index=index,
             nlp=nlp,
         )
 
-    def _start_indexing(self, path: Path, trigger: str) -> None:
+    def _start_indexing(self, paths: list[Path], trigger: str) -> None:
         self._index_run_id += 1
         run_id = self._index_run_id
 
         self.index_state = "loading"
         self.index = None
-        self.indexed_path = None
+        self.indexed_paths = []
         self.active_stage = "Preparando indexacion"
         self.index_start_time = monotonic()
         self._reset_search_state()
@@ -309,7 +426,7 @@ class QuijoteApp(App):
             self.loading_notice = "Indexando el archivo seleccionado."
 
         self._set_progress(run_id, "Preparando indexacion", None, None)
-        self.active_worker = self._indexar_en_background(path, run_id)
+        self.active_worker = self._indexar_en_background(paths, run_id)
         self._render_loading_status()
 
     def _cancel_active_worker(self) -> None:
@@ -323,7 +440,7 @@ class QuijoteApp(App):
         self.index_start_time = None
         self.index_state = "idle"
         self.index = None
-        self.indexed_path = None
+        self.indexed_paths = []
         self.loading_notice = None
         self.active_stage = "En espera"
         self._actualizar_sidebar([])
@@ -334,7 +451,7 @@ class QuijoteApp(App):
         self.index_start_time = None
         self.index_state = "error"
         self.index = None
-        self.indexed_path = None
+        self.indexed_paths = []
         self.loading_notice = None
         self.active_stage = "Error"
         self._actualizar_sidebar([])
@@ -364,6 +481,7 @@ class QuijoteApp(App):
                 snapshot.total,
                 elapsed,
                 self.loading_notice,
+                snapshot.throughput,
             )
         )
 
@@ -374,28 +492,32 @@ class QuijoteApp(App):
         completed: int | None,
         total: int | None,
     ) -> None:
-        with self._progress_lock:
-            if run_id != self._index_run_id:
-                return
-            self.active_stage = stage
-            self._progress_snapshot = ProgressSnapshot(
-                run_id=run_id,
-                stage=stage,
-                completed=completed,
-                total=total,
-                updated_at=monotonic(),
-            )
+        # Sin lock: se publica un snapshot nuevo reemplazando la referencia
+        # (asignacion atomica). Si en medio empieza otra indexacion, la UI
+        # descarta el snapshot viejo por su `run_id`.
+        if run_id != self._index_run_id:
+            return
+        now = monotonic()
+        previous = self._progress_snapshot
+        if previous.run_id != run_id:
+            stage_started_at = now
+        elif previous.stage != stage:
+            # La fase nueva empezo justo tras el ultimo aviso de la anterior.
+            stage_started_at = previous.updated_at
+        else:
+            stage_started_at = previous.stage_started_at
+        self.active_stage = stage
+        self._progress_snapshot = ProgressSnapshot(
+            run_id=run_id,
+            stage=stage,
+            completed=completed,
+            total=total,
+            updated_at=now,
+            stage_started_at=stage_started_at,
+        )
 
     def _get_progress_snapshot(self) -> ProgressSnapshot:
-        with self._progress_lock:
-            snapshot = self._progress_snapshot
-            return ProgressSnapshot(
-                run_id=snapshot.run_id,
-                stage=snapshot.stage,
-                completed=snapshot.completed,
-                total=snapshot.total,
-                updated_at=snapshot.updated_at,
-            )
+        return self._progress_snapshot
 
     def _should_cancel(self, worker: Worker[IndexingWorkerResult], run_id: int) -> bool:
         return worker.is_cancelled or run_id != self._index_run_id
@@ -416,16 +538,14 @@ class QuijoteApp(App):
                 )
                 return
 
-            path_text = self._file_input().value.strip() or str(
-                self.default_corpus_path
-            )
-            path = Path(path_text)
-            if not path.exists():
+            paths = self._parsear_rutas(self._file_input().value)
+            missing = next((path for path in paths if not path.exists()), None)
+            if missing is not None:
                 self.index_state = "error"
-                self._reader().update(render_missing_file(path))
+                self._reader().update(render_missing_file(missing))
                 return
 
-            self._start_indexing(path, "search")
+            self._start_indexing(paths, "search")
             return
 
         if index.total_chunks == 0:
@@ -443,20 +563,26 @@ class QuijoteApp(App):
             )
             return
 
+        consulta_limpia, documentos = separar_filtro_documentos(self.current_query)
         execution = orquestar_busqueda(
             index,
             self.selected_mode,
-            self.current_query,
+            consulta_limpia,
             self.DISPLAY_LIMIT,
+            documentos,
+            self.classic_cache,
         )
+        self._mostrar_ejecucion(execution, consulta_limpia)
+
+    def _mostrar_ejecucion(self, execution: SearchExecution, consulta: str) -> None:
         self.current_query_analysis = execution.query_analysis
-        self._actualizar_sidebar(execution.sidebar_results)
+        self._actualizar_sidebar(execution.sidebar_results, execution.results)
 
         if execution.mode == MODE_CLASSIC:
             self._reader().update(
                 render_classic_summary(
                     self.current_query_analysis.lemma_set,
-                    len(execution.mode_results),
+                    execution.results.total,
                     self.DISPLAY_LIMIT,
                 )
             )
@@ -466,18 +592,89 @@ class QuijoteApp(App):
             self._reader().update(
                 render_semantic_summary(
                     self.current_query_analysis.embedding_norm,
-                    execution.mode_results,
+                    execution.sidebar_results,
+                    execution.results.total,
                     self.DISPLAY_LIMIT,
                 )
             )
             return
 
         self._mostrar_respuesta_rag(
-            execution.mode_results,
+            consulta,
+            execution.results.todos(),
             execution.rag_classic_results,
             execution.rag_semantic_results,
         )
 
+    def _programar_busqueda_en_vivo(self, consulta: str) -> None:
+        self._cancelar_busqueda_en_vivo()
+        # RAG no se lanza en vivo: cada consulta llama a Ollama.
+        if (
+            self.selected_mode == MODE_RAG
+            or self.index_state != "ready"
+            or self.index is None
+        ):
+            return
+        generation = self._live_generation
+        self._live_timer = self.set_timer(
+            self.LIVE_SEARCH_DELAY,
+            lambda: self._lanzar_busqueda_en_vivo(consulta, generation),
+        )
+
+    def _cancelar_busqueda_en_vivo(self) -> None:
+        self._live_generation += 1
+        if self._live_timer is not None:
+            self._live_timer.stop()
+            self._live_timer = None
+
+    def _lanzar_busqueda_en_vivo(self, consulta: str, generation: int) -> None:
+        self._live_timer = None
+        if generation != self._live_generation:
+            return
+        if not consulta.strip():
+            self.ejecutar_busqueda(consulta)
+            return
+        self._buscar_en_vivo(consulta, generation)
+
+    @work(thread=True, group="live-search", exclusive=True, exit_on_error=False)
+    def _buscar_en_vivo(
+        self, consulta: str, generation: int
+    ) -> LiveSearchResult | None:
+        # `exclusive` cancela el worker anterior del grupo; ademas se comprueba
+        # la generacion para no calcular consultas que ya se han quedado viejas.
+        worker = get_current_worker()
+        index = self.index
+        if worker.is_cancelled or generation != self._live_generation or index is None:
+            return None
+
+        consulta = consulta.strip()
+        consulta_limpia, documentos = separar_filtro_documentos(consulta)
+        execution = orquestar_busqueda(
+            index,
+            self.selected_mode,
+            consulta_limpia,
+            self.DISPLAY_LIMIT,
+            documentos,
+            self.classic_cache,
+        )
+        return LiveSearchResult(generation, consulta, consulta_limpia, execution)
+
+    def _on_busqueda_en_vivo_state_changed(self, event: Worker.StateChanged) -> None:
+        if event.state != WorkerState.SUCCESS:
+            return
+        result = event.worker.result
+        if not isinstance(result, LiveSearchResult):
+            return
+        if (
+            result.generation != self._live_generation
+            or result.execution.mode != self.selected_mode
+            or self.index_state != "ready"
+        ):
+            return
+
+        self.current_query = result.consulta
+        self._mostrar_ejecucion(result.execution, result.consulta_limpia)
+
     def actualizar_modelo_ollama(self, modelo: str) -> None:
         normalized = modelo.strip() or self.default_rag_model
         model_input = self._model_input()
@@ -501,28 +698,24 @@ class QuijoteApp(App):
         self._reader().update(render_model_updated(normalized))
 
     def on_list_view_selected(self, event: ListView.Selected) -> None:
-        if event.item is None or event.item.name is None:
+        row = event.list_view.index
+        if event.list_view.id != "sidebar" or row is None or self.index is None:
             return
-
-        index = self.index
-        if index is None:
-            return
-
-        chunk_id = int(event.item.name)
-        chunk = index.chunk_by_id.get(chunk_id)
-        if chunk is None:
+        if self._sidebar_offset + row >= len(self.current_results):
             return
 
-        result = self.results_by_chunk_id.get(chunk_id)
-        self._reader().update(
-            render_chunk_detail(
-                chunk.titulo,
-                chunk.texto,
-                self.current_query_analysis.lemma_set,
-                format_result_metadata(result),
-                self.nlp,
+        result = self.current_results[self._sidebar_offset + row]
+        chunk = result.chunk
+        metadata = format_result_metadata(result)
+        lemma_set = self.current_query_analysis.lemma_set
+        # Reabrir el mismo pasaje con la misma consulta no vuelve a resaltar.
+        key = (chunk.chunk_id, lemma_set, metadata)
+        if self._detail_cache is None or self._detail_cache[0] != key:
+            detail = render_chunk_detail(
+                chunk.titulo, chunk.texto, lemma_set, metadata, self.nlp
             )
-        )
+            self._detail_cache = (key, detail)
+        self._reader().update(self._detail_cache[1])
 
     def _mostrar_exploracion_inicial(self) -> None:
         index = self.index
@@ -530,31 +723,137 @@ class QuijoteApp(App):
             self._actualizar_sidebar([])
             return
 
-        initial = [
-            SearchResult(chunk=chunk, score=0.0, modo=MODE_BROWSE)
-            for chunk in index.chunks[: self.DISPLAY_LIMIT]
-        ]
-        self._actualizar_sidebar(initial)
+        cursor = ResultCursor(
+            [(0.0, position) for position in range(len(index.chunks))],
+            lambda position, score: SearchResult(
+                chunk=index.chunks[position], score=score, modo=MODE_BROWSE
+            ),
+            ordenados=True,
+        )
+        self._actualizar_sidebar(cursor.siguiente_pagina(self.DISPLAY_LIMIT), cursor)
 
-    def _actualizar_sidebar(self, resultados: list[SearchResult]) -> None:
+    def _actualizar_sidebar(
+        self,
+        resultados: list[SearchResult],
+        cursor: ResultCursor | None = None,
+    ) -> None:
+        self.current_cursor = cursor if cursor is not None else ResultCursor.vacio()
+        self.current_results = list(resultados)
+        self._sidebar_offset = 0
+        self._sidebar_seleccion = None
+        self._pintar_sidebar()
         sidebar = self._sidebar()
-        sidebar.clear()
-
-        self.current_results = resultados
-        self.results_by_chunk_id = {
-            result.chunk.chunk_id: result for result in resultados
-        }
-
-        for result in resultados:
-            sidebar.append(
-                ListItem(
-                    Static(format_sidebar_label(result)),
-                    name=str(result.chunk.chunk_id),
-                )
-            )
+        sidebar.index = None
+        sidebar.scroll_home(animate=False)
+
+    def _pintar_sidebar(self) -> None:
+        """Vuelca en las filas montadas la ventana que empieza en `_sidebar_offset`.
+
+        Las filas son un pool de como mucho SIDEBAR_MAX_ROWS widgets: solo se
+        reformatean las que cambian de pasaje o score, se crean las que
+        faltan y se retiran las que sobran.
+        """
+        sidebar = self._sidebar()
+        inicio = self._sidebar_offset
+        ventana = self.current_results[inicio : inicio + self.SIDEBAR_MAX_ROWS]
+        new_rows: list[ListItem] = []
+        for row, result in enumerate(ventana):
+            key = (result.chunk.chunk_id, result.score)
+            if row < len(self._sidebar_rows):
+                if self._sidebar_keys[row] != key:
+                    self._sidebar_rows[row][1].update(format_sidebar_label(result))
+                    self._sidebar_keys[row] = key
+                continue
+
+            label = Static(format_sidebar_label(result))
+            item = ListItem(label)
+            self._sidebar_rows.append((item, label))
+            self._sidebar_keys.append(key)
+            new_rows.append(item)
+        if new_rows:
+            sidebar.extend(new_rows)
+
+        visible = len(ventana)
+        if len(self._sidebar_rows) > visible:
+            sidebar.remove_items(range(visible, len(self._sidebar_rows)))
+            del self._sidebar_rows[visible:]
+            del self._sidebar_keys[visible:]
+
+    def _anexar_sidebar(self, resultados: list[SearchResult]) -> None:
+        # Los resultados nuevos solo se montan si caben en el pool; si no,
+        # esperan a que la ventana llegue hasta ellos.
+        self.current_results.extend(resultados)
+        if len(self._sidebar_rows) < self.SIDEBAR_MAX_ROWS:
+            self._pintar_sidebar()
+
+    def _desplazar_sidebar(self, filas: int) -> None:
+        """Mueve la ventana de filas montadas `filas` resultados (negativo: arriba).
+
+        Compensa el scroll con la altura de las filas desplazadas, de modo que
+        lo que se ve no salta, y recoloca el resaltado sobre su resultado.
+        """
+        tope = max(0, len(self.current_results) - self.SIDEBAR_MAX_ROWS)
+        offset = min(max(self._sidebar_offset + filas, 0), tope)
+        delta = offset - self._sidebar_offset
+        if delta == 0 or len(self._sidebar_rows) < 2:
+            return
+
+        sidebar = self._sidebar()
+        primera, segunda = self._sidebar_rows[0][0], self._sidebar_rows[1][0]
+        alto = segunda.virtual_region.y - primera.virtual_region.y
+        self._sidebar_offset = offset
+        self._pintar_sidebar()
+        self._recolocar_resaltado()
+        sidebar.scroll_to(y=sidebar.scroll_y - delta * alto, animate=False)
+
+    def _recolocar_resaltado(self) -> None:
+        # Se fija el indice sin pasar por watch_index: este haria scroll hasta
+        # la fila y publicaria un Highlighted que volveria a mover la ventana.
+        sidebar = self._sidebar()
+        local = None
+        if self._sidebar_seleccion is not None:
+            local = self._sidebar_seleccion - self._sidebar_offset
+            if not 0 <= local < len(self._sidebar_rows):
+                local = None
+        for row, (item, _label) in enumerate(self._sidebar_rows):
+            item.highlighted = row == local
+        sidebar.set_reactive(ListView.index, local)
+
+    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
+        row = event.list_view.index
+        if event.list_view.id != "sidebar" or row is None:
+            return
+        self._sidebar_seleccion = self._sidebar_offset + row
+        if len(self._sidebar_rows) - 1 - row < self.SIDEBAR_PREFETCH_ROWS:
+            self._avanzar_sidebar()
+        elif row < self.SIDEBAR_PREFETCH_ROWS:
+            self._desplazar_sidebar(-self.DISPLAY_LIMIT)
+
+    def _on_sidebar_scroll(self, scroll_y: float) -> None:
+        sidebar = self._sidebar()
+        if sidebar.max_scroll_y - scroll_y < self.SIDEBAR_PREFETCH_ROWS:
+            self._avanzar_sidebar()
+        elif scroll_y < self.SIDEBAR_PREFETCH_ROWS:
+            self._desplazar_sidebar(-self.DISPLAY_LIMIT)
+
+    def _avanzar_sidebar(self) -> None:
+        # Si la ventana ya llega a los ultimos resultados servidos se pide
+        # la siguiente pagina antes de desplazarla.
+        montados = self._sidebar_offset + len(self._sidebar_rows)
+        if len(self.current_results) - montados < self.SIDEBAR_PREFETCH_ROWS:
+            self._cargar_mas_resultados()
+        self._desplazar_sidebar(self.DISPLAY_LIMIT)
+
+    def _cargar_mas_resultados(self) -> None:
+        # La siguiente pagina sale del cursor de la ultima consulta: no se
+        # vuelve a ejecutar la busqueda ni a ordenar los candidatos.
+        if self.current_cursor.agotado:
+            return
+        self._anexar_sidebar(self.current_cursor.siguiente_pagina(self.DISPLAY_LIMIT))
 
     def _mostrar_respuesta_rag(
         self,
+        consulta: str,
         fusion: list[SearchResult],
         clasicos: list[SearchResult],
         semanticos: list[SearchResult],
@@ -563,9 +862,11 @@ class QuijoteApp(App):
             self._reader().update("[b red]RAG sin contexto suficiente.[/b red]")
             return
 
+        from src.modes.rag_mode import generar_respuesta_ollama
+
         modelo = self._obtener_modelo_ollama()
         try:
-            answer = generar_respuesta_ollama(self.current_query, fusion, modelo)
+            answer = generar_respuesta_ollama(consulta, fusion, modelo)
         except Exception as exc:
             self._reader().update(
                 render_rag_error(
@@ -618,6 +919,39 @@ class QuijoteApp(App):
     def _sidebar(self) -> ListView:
         return self.query_one("#sidebar", ListView)
 
+    def action_toggle_live_search(self) -> None:
+        self.live_search = not self.live_search
+        self._cancelar_busqueda_en_vivo()
+        estado = "activada" if self.live_search else "desactivada"
+        self.notify(f"Busqueda en vivo {estado}.")
+
+    def action_export_index(self) -> None:
+        index = self.index
+        if self.index_state != "ready" or index is None or not self.indexed_paths:
+            self.notify("No hay un indice listo para exportar.", severity="warning")
+            return
+
+        path = self.indexed_paths[0].with_suffix(SNAPSHOT_SUFFIX)
+        if path in self.indexed_paths:
+            self.notify("El indice ya se cargo desde ese snapshot.", severity="warning")
+            return
+        self.notify(f"Exportando indice a {path}...")
+        self._exportar_en_background(index, path)
+
+    @work(thread=True, group="export", exclusive=True, exit_on_error=False)
+    def _exportar_en_background(self, index: QuijoteIndex, path: Path) -> str:
+        size = exportar_indice(index, path)
+        return f"Indice exportado a {path} ({size / 1_000_000:.1f} MB)."
+
+    def _on_exportacion_state_changed(self, event: Worker.StateChanged) -> None:
+        if event.state == WorkerState.SUCCESS:
+            self.notify(str(event.worker.result))
+        elif event.state == WorkerState.ERROR:
+            self.notify(
+                f"No se pudo exportar el indice: {event.worker.error}",
+                severity="error",
+            )
+
     def action_focus_file(self) -> None:
         self._file_input().focus()
 
@@ -634,8 +968,29 @@ class QuijoteApp(App):
         self._model_input().focus()
 
 
-def run() -> None:
-    QuijoteApp().run()
+def run(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Quijote IR (TUI)")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Muestra el desglose del tiempo de import y del primer frame.",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.profile_startup:
+        QuijoteApp().run()
+        return
+
+    from src.startup_profile import formatear_perfil, medir_importaciones
+
+    total_ms, timings = medir_importaciones()
+    app = QuijoteApp()
+    app.run()
+    print(formatear_perfil(total_ms, timings))
+    if app.first_frame_seconds is not None:
+        print(
+            f"Primer frame: {app.first_frame_seconds * 1000:.1f} ms tras crear la app"
+        )
 
 
 if __name__ == "__main__":
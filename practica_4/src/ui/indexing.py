@@ -10,16 +10,32 @@ from src.preprocessing import QuijoteIndex
 @dataclass(slots=True)
 class IndexingWorkerResult:
     run_id: int
-    path: Path
+    paths: list[Path]
     stats: dict[str, int]
     index: QuijoteIndex
     nlp: Any
 
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class ProgressSnapshot:
+    """Estado de progreso publicado por el worker de indexacion.
+
+    Es inmutable: el worker crea uno nuevo y reemplaza la referencia, asi que
+    la UI siempre lee un estado completo sin necesidad de lock.
+    """
+
     run_id: int
     stage: str
     completed: int | None
     total: int | None
     updated_at: float
+    # Momento en que empezo la fase actual, para medir su velocidad.
+    stage_started_at: float
+
+    @property
+    def throughput(self) -> float | None:
+        """Chunks por segundo en la fase actual, si tiene contador."""
+        elapsed = self.updated_at - self.stage_started_at
+        if not self.completed or elapsed <= 0:
+            return None
+        return self.completed / elapsed
@@ -9,10 +9,8 @@ from rich.console import Group
 from rich.markup import escape
 from rich.text import Text
 
-from src.modes.classic_mode import MODE_CLASSIC
-from src.modes.rag_mode import MODE_RAG
-from src.modes.semantic_mode import MODE_SEMANTIC
-from src.preprocessing import SearchResult
+from src.modes import MODE_CLASSIC, MODE_SEMANTIC
+from src.preprocessing import DocumentRecord, SearchResult
 
 
 MODE_BROWSE = "browse"
@@ -39,15 +37,28 @@ def render_missing_file(path: Path) -> str:
 
 
 def render_index_ready(
-    path: Path,
+    documents: Iterable[DocumentRecord],
     stats: Mapping[str, int],
     chunk_size_words: int,
     chunk_overlap_words: int,
     model: str,
 ) -> str:
+    documents = list(documents)
+    if len(documents) == 1:
+        documents_block = f"Archivo indexado: {escape(str(documents[0].path))}\n"
+    else:
+        documents_block = "Documentos indexados:\n" + "".join(
+            f"  doc {document.doc_id}: {escape(document.nombre)} "
+            f"({document.total_chunks} pasajes)\n"
+            for document in documents
+        )
+        documents_block += (
+            "[dim]Filtra una consulta con el prefijo doc:1,2 "
+            "(ej. doc:2 molinos de viento).[/dim]\n"
+        )
     return (
         "[b #8b0000]Indice listo[/]\n\n"
-        f"Archivo indexado: {escape(str(path))}\n"
+        f"{documents_block}"
         f"Secciones detectadas: {stats['sections']}\n"
         f"Pasajes indexados: {stats['chunks']}\n"
         f"Tamano de chunk: {chunk_size_words} palabras\n"
@@ -75,9 +86,11 @@ def render_loading_status(
     total: int | None,
     elapsed: float,
     notice: str | None = None,
+    throughput: float | None = None,
 ) -> str:
     counts_text = "--"
     percent_text = "--"
+    speed_text = "--"
     eta_text = "calculando ETA..."
 
     if total and completed is not None and total > 0:
@@ -85,10 +98,11 @@ def render_loading_status(
         percent = (safe_completed / total) * 100.0
         counts_text = f"{safe_completed}/{total}"
         percent_text = f"{percent:.1f}%"
-        if safe_completed > 0:
+        if throughput:
+            # La velocidad es de la fase actual, asi que la ETA tambien.
+            speed_text = f"{throughput:.1f} chunks/s"
             remaining_steps = max(0, total - safe_completed)
-            eta_seconds = (elapsed / safe_completed) * remaining_steps
-            eta_text = format_duration(eta_seconds)
+            eta_text = format_duration(remaining_steps / throughput)
 
     notice_block = ""
     if notice:
@@ -98,12 +112,25 @@ def render_loading_status(
         "[b #8b0000]Indexando corpus...[/]\n\n"
         f"Fase: {escape(stage)}\n"
         f"Progreso: {escape(counts_text)} ({escape(percent_text)})\n"
+        f"Velocidad: {escape(speed_text)}\n"
         f"Tiempo transcurrido: {format_duration(elapsed)}\n"
-        f"ETA: {escape(eta_text)}"
+        f"ETA de la fase: {escape(eta_text)}"
         f"{notice_block}"
     )
 
 
+def format_model_loading_status() -> str:
+    return "Precargando modelo spaCy..."
+
+
+def format_model_ready_status(load_seconds: float) -> str:
+    return f"spaCy listo · arranque en frio {load_seconds:.1f}s"
+
+
+def format_model_error_status(reason: str) -> str:
+    return f"spaCy no disponible: {truncate(reason, 60)}"
+
+
 def render_chunk_detail(
     chunk_title: str,
     chunk_text: str,
@@ -143,7 +170,7 @@ def render_classic_summary(
         "[b #8b0000]Busqueda clasica[/]\n\n"
         f"Consulta lematizada: {serialized_lemmas}\n"
         f"Resultados recuperados: {results_count}\n"
-        f"Mostrando: {shown}\n\n"
+        f"Mostrando: {shown} (baja por la barra lateral para cargar mas)\n\n"
         "Selecciona un pasaje en la barra lateral para ver el texto con los lemas resaltados."
     )
 
@@ -151,6 +178,7 @@ def render_classic_summary(
 def render_semantic_summary(
     embedding_norm: float,
     results: list[SearchResult],
+    results_count: int,
     display_limit: int,
 ) -> str:
     if embedding_norm == 0:
@@ -162,10 +190,11 @@ def render_semantic_summary(
     if not results:
         return "[b red]Sin resultados semanticos.[/b red]"
 
-    shown = min(len(results), display_limit)
+    shown = min(results_count, display_limit)
     return (
         "[b #8b0000]Busqueda semantica[/]\n\n"
         "Pasajes ordenados por similitud coseno con el embedding de la consulta.\n"
+        f"Resultados recuperados: {results_count}\n"
         f"Mostrando top: {shown}\n"
         f"Mejor score: {results[0].score:.4f}\n\n"
         "Selecciona un pasaje para inspeccionar el texto recuperado."
@@ -216,7 +245,7 @@ def format_result_metadata(result: SearchResult | None) -> str:
         return f"[dim]Similitud coseno: {result.score:.4f}[/dim]"
     return (
         "[dim]"
-        f"RRF: {result.score:.4f} | "
+        f"RAG: {result.score:.4f} | "
         f"clasico: {result.clasico_score:.4f} | "
         f"semantico: {result.semantico_score:.4f}"
         "[/dim]"
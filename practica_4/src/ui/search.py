@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from src.orchestrator import SearchExecution
+
+
+@dataclass(slots=True)
+class LiveSearchResult:
+    generation: int
+    consulta: str
+    consulta_limpia: str
+    execution: SearchExecution
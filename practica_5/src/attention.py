@@ -7,8 +7,56 @@ import math
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch.nn.functional import softmax
 
+# Implementaciones de la atención: "manual" es la de este fichero, paso a paso;
+# "sdpa" usa scaled_dot_product_attention de pytorch, que hace lo mismo en una
+# sola operación fusionada (sin guardar la matriz de scores entera si puede)
+BACKENDS = ("manual", "sdpa")
+DEFAULT_BACKEND = "sdpa" if hasattr(F, "scaled_dot_product_attention") else "manual"
+
+
+def causal_mask(n_tokens, pasados=0, device=None):
+    """Máscara causal (n_tokens, pasados + n_tokens) de bool.
+
+    True en las posiciones "futuras" (triangular superior), a las que cada
+    token no puede atender. Las filas son los `n_tokens` tokens nuevos, que
+    van detrás de `pasados` tokens ya procesados (en la KV cache).
+
+    Se genera en cada forward en vez de guardarla: ocupa
+    n_tokens × (pasados + n_tokens) bools (n_tokens² sin cache), mucho menos
+    que la matriz de scores, y no crece con max_seq_len.
+    """
+    return torch.ones(
+        n_tokens, pasados + n_tokens, dtype=torch.bool, device=device
+    ).triu(diagonal=pasados + 1)
+
+
+class KVCache:
+    """Keys y values ya calculados por una capa de atención.
+
+    Al generar, cada token nuevo solo necesita su query y las keys/values de
+    los anteriores, que no cambian: los guardamos aquí para no recalcularlos.
+    Tensores con forma (batch_size, n_heads, n_tokens, head_dim).
+    """
+
+    def __init__(self):
+        self.k = None
+        self.v = None
+
+    def __len__(self):
+        return 0 if self.k is None else self.k.shape[-2]
+
+    def update(self, k, v):
+        """Añade las keys/values de los tokens nuevos y devuelve todas."""
+        if self.k is None:
+            self.k, self.v = k, v
+        else:
+            self.k = torch.cat([self.k, k], dim=-2)
+            self.v = torch.cat([self.v, v], dim=-2)
+        return self.k, self.v
+
 
 class Attention(nn.Module):
     """Auto-atención multi-cabezal con escala (scaled multi-head self-attention)
@@ -18,6 +66,16 @@ class Attention(nn.Module):
     atiende a toda la secuencia (TAREA: para qué querríamos esto?).
 
     dropout es el porcentaje de dropout a usar.
+
+    Si se pasa una `KVCache`, `x` son solo los tokens nuevos: se atiende a
+    ellos y a todos los guardados en la cache, que se actualiza.
+
+    `padding_mask` (batch_size, n_keys) marca con True los tokens reales y con
+    False el relleno de las secuencias más cortas de un batch, al que nunca
+    se atiende. n_keys incluye los tokens de la cache.
+
+    `backend` elige la implementación (ver BACKENDS); se puede cambiar en
+    cualquier momento, los pesos son los mismos.
     """
 
     def __init__(self, d_model, n_heads, max_seq_len, dropout):
@@ -32,15 +90,19 @@ class Attention(nn.Module):
         self.out = nn.Linear(d_model, d_model)
         # El dropout se activa en train y desactiva en test gracias a pytorch
         self.dropout = nn.Dropout(dropout)
-        # La máscara causal pone a -inf las posiciones correspondientes a tokens
-        # "futuros" (triangular superior)
-        mask = torch.triu(
-            torch.full((max_seq_len, max_seq_len), float("-inf")), diagonal=1
-        )
-        # Registramos la máscara causal como tensor (no entrenable)
-        self.register_buffer("mask", mask)
+        # La máscara causal no se guarda en el módulo (ver causal_mask): una
+        # matriz max_seq_len x max_seq_len por capa, que además acababa en el
+        # state_dict. Los checkpoints antiguos la traen y se ignora al cargar.
+        # El argumento max_seq_len ya no se usa; se mantiene para no cambiar
+        # la firma del constructor
+        self.backend = DEFAULT_BACKEND
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Compatibilidad con los .pth guardados cuando la máscara era un buffer
+        state_dict.pop(prefix + "mask", None)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
-    def forward(self, x, causal=True):
+    def forward(self, x, causal=True, cache=None, padding_mask=None):
         # Los tensores de pytorch tienen primero una dimensión batch
         # (entrenamiento más eficiente si hacemos varios a la vez)
         # luego tokens y luego ya la dimensión de los embeddings
@@ -53,25 +115,73 @@ class Attention(nn.Module):
         q = self.split_heads(q)
         k = self.split_heads(k)
         v = self.split_heads(v)
+        # Con cache, las queries son las de los tokens nuevos, pero las keys y
+        # values incluyen también las de los tokens anteriores
+        pasados = 0
+        if cache is not None:
+            pasados = len(cache)
+            k, v = cache.update(k, v)
 
+        if self.backend == "sdpa":
+            z = self._sdpa(q, k, v, pasados, causal, padding_mask)
+        else:
+            z = self._manual(q, k, v, pasados, causal, padding_mask)
+
+        # "deshacemos" la partición en cabezales
+        # (batch_size, n_heads, n_tokens, head_dim) -> (batch_size, n_tokens, d_model)
+        z = z.transpose(1, 2).flatten(-2)
+
+        # re-proyectamos con la última transformación
+        return self.out(z)
+
+    def _manual(self, q, k, v, pasados, causal, padding_mask):
+        n_tokens = q.shape[-2]
         # TAREA: Implementar
         # Nota: para escalar, dividir por raíz de head_dim (para que los logits
         # no crezcan sin control)
         a = q @ k.transpose(-2, -1)
         a /= math.sqrt(self.head_dim)
         if causal:
-            a += self.mask[:n_tokens, :n_tokens]
+            # Ponemos a -inf las posiciones de tokens "futuros"
+            a = a.masked_fill(causal_mask(n_tokens, pasados, a.device), float("-inf"))
+        if padding_mask is not None:
+            # Usamos el mínimo representable y no -inf para que las filas de
+            # los propios tokens de relleno (que solo ven relleno) no den NaN
+            a = a.masked_fill(
+                ~padding_mask[:, None, None, :], torch.finfo(a.dtype).min
+            )
         a = softmax(a, dim=-1)
 
         a = self.dropout(a)
-        z = a @ v
+        return a @ v
 
-        # "deshacemos" la partición en cabezales
-        # (batch_size, n_heads, n_tokens, head_dim) -> (batch_size, n_tokens, d_model)
-        z = z.transpose(1, 2).flatten(-2)
-
-        # re-proyectamos con la última transformación
-        return self.out(z)
+    def _sdpa(self, q, k, v, pasados, causal, padding_mask):
+        n_tokens = q.shape[-2]
+        dropout_p = self.dropout.p if self.training else 0.0
+        if padding_mask is None and (not causal or n_tokens == 1):
+            # Sin máscara: sin causalidad, o un único token nuevo que puede
+            # atender a todo lo que hay en la cache
+            return F.scaled_dot_product_attention(q, k, v, dropout_p=dropout_p)
+        if padding_mask is None and pasados == 0:
+            # El caso del entrenamiento: máscara causal implícita, sin tensor
+            return F.scaled_dot_product_attention(
+                q, k, v, dropout_p=dropout_p, is_causal=True
+            )
+        # En el resto de casos pasamos una máscara aditiva, como en _manual
+        attn_mask = torch.zeros(
+            (n_tokens, pasados + n_tokens), dtype=q.dtype, device=q.device
+        )
+        if causal:
+            attn_mask = attn_mask.masked_fill(
+                causal_mask(n_tokens, pasados, q.device), float("-inf")
+            )
+        if padding_mask is not None:
+            attn_mask = attn_mask.masked_fill(
+                ~padding_mask[:, None, None, :], torch.finfo(q.dtype).min
+            )
+        return F.scaled_dot_product_attention(
+            q, k, v, attn_mask=attn_mask, dropout_p=dropout_p
+        )
 
     def split_heads(self, x):
         # (batch_size, n_tokens, d_model) -> (batch_size, n_tokens, n_heads, head_dim)
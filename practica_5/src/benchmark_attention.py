@@ -0,0 +1,94 @@
+# Comparación de las implementaciones de la atención (manual y sdpa)
+#
+# PLN 2025/2026 (FDI UCM)
+
+import time
+
+import torch
+from loguru import logger
+from torch.profiler import ProfilerActivity, profile
+
+from attention import Attention, KVCache
+
+
+def comprobar_backends(d_model=128, n_heads=4, max_seq_len=128):
+    """Máxima diferencia entre la salida de "sdpa" y la de "manual".
+
+    Cubre los casos que usa el modelo: causal y no causal, con KV cache
+    (prompt entero y luego token a token) y con relleno a la izquierda.
+    """
+    torch.manual_seed(0)
+    attn = Attention(d_model, n_heads, max_seq_len, dropout=0.0).eval()
+    x = torch.randn(3, 40, d_model)
+    padding_mask = torch.ones(3, 40, dtype=torch.bool)
+    padding_mask[1, :7] = False
+    padding_mask[2, :25] = False
+
+    def salidas(backend):
+        attn.backend = backend
+        with torch.no_grad():
+            resultado = [
+                attn(x, causal=True),
+                attn(x, causal=False),
+                attn(x, causal=True, padding_mask=padding_mask),
+            ]
+            # Con cache: 30 tokens de golpe y luego de uno en uno
+            cache = KVCache()
+            pasos = [attn(x[:, :30], cache=cache, padding_mask=padding_mask[:, :30])]
+            for i in range(30, 40):
+                pasos.append(
+                    attn(
+                        x[:, i : i + 1],
+                        cache=cache,
+                        padding_mask=padding_mask[:, : i + 1],
+                    )
+                )
+            resultado.append(torch.cat(pasos, dim=1))
+        # Las filas del relleno no se usan y pueden diferir: las anulamos
+        return [
+            r if i < 2 else r * padding_mask[..., None] for i, r in enumerate(resultado)
+        ]
+
+    return max(
+        (a - b).abs().max().item() for a, b in zip(salidas("manual"), salidas("sdpa"))
+    )
+
+
+def medir(attn, x, repeticiones=10):
+    """Milisegundos por forward (mejor de `repeticiones`) y MB reservados."""
+    with torch.no_grad():
+        attn(x)
+        mejor = float("inf")
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            attn(x)
+            mejor = min(mejor, time.perf_counter() - t0)
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            attn(x)
+    reservado = sum(
+        evento.self_cpu_memory_usage
+        for evento in prof.key_averages()
+        if evento.self_cpu_memory_usage > 0
+    )
+    return mejor * 1000, reservado / 2**20
+
+
+if __name__ == "__main__":
+    diferencia = comprobar_backends()
+    logger.info(f"Máxima diferencia manual/sdpa: {diferencia:.2e}")
+
+    # Velocidad y memoria a distintas longitudes (batch de 8, como un
+    # entrenamiento pequeño, sin gradientes)
+    d_model, n_heads = 128, 4
+    for n_tokens in (128, 256, 512, 1024, 2048):
+        attn = Attention(d_model, n_heads, n_tokens, dropout=0.0).eval()
+        x = torch.randn(8, n_tokens, d_model)
+        medidas = {}
+        for backend in ("manual", "sdpa"):
+            attn.backend = backend
+            medidas[backend] = medir(attn, x)
+        (t_manual, m_manual), (t_sdpa, m_sdpa) = medidas["manual"], medidas["sdpa"]
+        logger.info(
+            f"n={n_tokens:>4} | manual: {t_manual:7.2f} ms {m_manual:7.1f} MB | "
+            f"sdpa: {t_sdpa:7.2f} ms {m_sdpa:7.1f} MB | x{t_manual / t_sdpa:.1f}"
+        )
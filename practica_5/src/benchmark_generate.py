@@ -0,0 +1,103 @@
+# Medición de la velocidad de generación: KV cache y batches de prompts
+#
+# PLN 2025/2026 (FDI UCM)
+
+import time
+
+import torch
+from loguru import logger
+
+from causalLLM import CausalLLM
+
+
+def comprobar_cache(model, prompt, n_tokens=20):
+    """Compara los logits con cache (token a token) con los del forward completo.
+
+    Devuelve la máxima diferencia absoluta encontrada.
+    """
+    model.eval()
+    device = next(model.parameters()).device
+    idx = torch.tensor([prompt + list(range(n_tokens))], device=device)
+    with torch.no_grad():
+        completos, _ = model(idx)
+        cache = model.new_cache()
+        incrementales, _ = model(idx[:, : len(prompt)], cache=cache)
+        pasos = [incrementales]
+        for i in range(len(prompt), idx.shape[1]):
+            logits, _ = model(idx[:, i : i + 1], cache=cache)
+            pasos.append(logits)
+    return (completos - torch.cat(pasos, dim=1)).abs().max().item()
+
+
+def medir(model, prompt, max_tokens, use_cache, repeticiones=3):
+    """Tokens por segundo de `generate` (mejor de `repeticiones`)."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        model.generate(prompt, max_tokens=max_tokens, use_cache=use_cache)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return max_tokens / mejor
+
+
+def medir_batch(model, prompts, max_tokens, repeticiones=3):
+    """Tokens por segundo generando `prompts` uno a uno y en un solo batch."""
+    uno_a_uno = float("inf")
+    en_batch = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        for prompt in prompts:
+            model.generate(prompt, max_tokens=max_tokens)
+        uno_a_uno = min(uno_a_uno, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        model.generate_batch(prompts, max_tokens=max_tokens)
+        en_batch = min(en_batch, time.perf_counter() - t0)
+    total = len(prompts) * max_tokens
+    return total / uno_a_uno, total / en_batch
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Mismos hiperparámetros que train.py. Si se pasa un .pth, se cargan sus
+    # pesos (la velocidad no depende de ellos, pero así se comprueba con un
+    # modelo entrenado)
+    CONTEXT_SIZE = 128
+    model = CausalLLM(
+        vocab_size=300,
+        max_seq_len=CONTEXT_SIZE,
+        d_model=128,
+        n_heads=4,
+        n_layers=2,
+        expansion=4,
+        dropout=0.2,
+    )
+    if len(sys.argv) > 1:
+        model.load_state_dict(torch.load(sys.argv[1], map_location="cpu"))
+
+    torch.manual_seed(0)
+    prompt = torch.randint(0, 300, (16,)).tolist()
+
+    diferencia = comprobar_cache(model, prompt, n_tokens=CONTEXT_SIZE - len(prompt))
+    logger.info(f"Máxima diferencia de logits con/sin cache: {diferencia:.2e}")
+
+    # Generación dentro de la ventana, y más allá (la ventana se desliza y la
+    # cache deja de servir a partir de CONTEXT_SIZE tokens)
+    for max_tokens in (CONTEXT_SIZE - len(prompt), 2 * CONTEXT_SIZE):
+        sin_cache = medir(model, prompt, max_tokens, use_cache=False)
+        con_cache = medir(model, prompt, max_tokens, use_cache=True)
+        logger.info(
+            f"{max_tokens} tokens | sin cache: {sin_cache:.0f} tok/s | "
+            f"con cache: {con_cache:.0f} tok/s | x{con_cache / sin_cache:.1f}"
+        )
+
+    # Varios prompts de distinta longitud: uno a uno frente a un único batch
+    for n_prompts in (8, 32):
+        prompts = [
+            torch.randint(0, 300, (int(n),)).tolist()
+            for n in torch.randint(4, 32, (n_prompts,))
+        ]
+        uno_a_uno, en_batch = medir_batch(model, prompts, 64, repeticiones=1)
+        logger.info(
+            f"{n_prompts} prompts x 64 tokens | uno a uno: {uno_a_uno:.0f} tok/s | "
+            f"en batch: {en_batch:.0f} tok/s | x{en_batch / uno_a_uno:.1f}"
+        )
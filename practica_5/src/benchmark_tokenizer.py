@@ -0,0 +1,81 @@
+# Medición de la velocidad de encode: en serie y repartido en procesos
+#
+# PLN 2025/2026 (FDI UCM)
+
+import copy
+import time
+
+from loguru import logger
+
+from tokenizer import BPETokenizer, cpus_disponibles
+
+
+def medir_serie(tokenizer, text):
+    """Segundos de `encode` en un proceso, con la cache vacía, e ids."""
+    tokenizer._cache = {}
+    t0 = time.perf_counter()
+    ids = tokenizer.encode(text)
+    return time.perf_counter() - t0, ids
+
+
+def medir_paralelo(tokenizer, text, n_workers):
+    """Segundos e ids del encode en `n_workers` procesos.
+
+    Llama directamente a `_encode_parallel`, que `encode` no usa si hay
+    menos CPUs que procesos, para poder medirlo en cualquier máquina.
+    """
+    tokenizer._cache = {}
+    t0 = time.perf_counter()
+    ids = tokenizer._encode_parallel(text, n_workers)
+    return time.perf_counter() - t0, ids
+
+
+def camino_critico(tokenizer, text, n_workers):
+    """Estimación del encode en paralelo con una CPU libre por proceso.
+
+    Codifica cada bloque por separado, como lo haría su proceso (con la
+    cache vacía), y devuelve el tiempo del bloque más lento: con CPUs de
+    sobra, los bloques van a la vez y es lo que se tarda, sin contar el
+    arranque de los procesos ni el envío de los resultados.
+    """
+    cortes = [0]
+    for i in range(1, n_workers):
+        corte = tokenizer._corte_cercano(text, len(text) * i // n_workers)
+        if corte is not None and corte > cortes[-1]:
+            cortes.append(corte)
+    cortes.append(len(text))
+    peor = 0.0
+    for a, b in zip(cortes, cortes[1:]):
+        worker = copy.copy(tokenizer)
+        worker._cache = {}
+        t0 = time.perf_counter()
+        worker.encode(text[a:b])
+        peor = max(peor, time.perf_counter() - t0)
+    return peor
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    files_path = Path(sys.argv[1] if len(sys.argv) > 1 else "resources")
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    corpus = "\n\n".join(open(p).read() for p in files_path.glob("*.txt"))
+    # Repetimos el corpus para tener un texto grande (la cache ayuda más que
+    # con texto real, pero en serie y en paralelo por igual)
+    text = corpus * repeticiones
+    logger.info(f"{len(text):,} caracteres, {cpus_disponibles()} CPUs disponibles")
+
+    for byte_level, vocab_size in ((False, 1000), (True, 1256)):
+        tokenizer = BPETokenizer(corpus, vocab_size=vocab_size, byte_level=byte_level)
+        serie, esperado = medir_serie(tokenizer, text)
+        logger.info(f"byte_level={byte_level} | serie: {serie:.2f}s")
+        for n_workers in (2, 4):
+            paralelo, ids = medir_paralelo(tokenizer, text, n_workers)
+            critico = camino_critico(tokenizer, text, n_workers)
+            assert ids == esperado, "el encode en paralelo no coincide"
+            logger.info(
+                f"  {n_workers} procesos | medido: {paralelo:.2f}s "
+                f"(x{serie / paralelo:.1f}) | bloque más lento: {critico:.2f}s "
+                f"(x{serie / critico:.1f} con {n_workers} CPUs libres)"
+            )
@@ -35,14 +35,20 @@ class CausalLLM(Transformer):
         # (weight tying)
         self.lm_head.weight = self.tok_emb.weight
 
-    def forward(self, idx, targets=None):
+    def forward(self, idx, targets=None, cache=None, pos=None, padding_mask=None):
         """Devuelve (logits, loss).
 
         idx      Tensor (batch, n_tokens) con ids de tokens de entrada
         targets  Tensor (batch, n_tokens) con ids objetivo; si se pasa,
                  calcula el loss de language modeling
+        cache    Lista de KVCache para generar incrementalmente (ver
+                 Transformer.forward)
+        pos, padding_mask  Posiciones y máscara de relleno para batches de
+                 secuencias de distinta longitud (ver Transformer.forward)
         """
-        x = super().forward(idx, causal=True)
+        x = super().forward(
+            idx, causal=True, cache=cache, pos=pos, padding_mask=padding_mask
+        )
 
         # Calculamos los logits para cada elemento del vocabulario
         logits = self.lm_head(x)
@@ -57,7 +63,7 @@ class CausalLLM(Transformer):
         return logits, loss
 
     @torch.no_grad()
-    def generate(self, prompt, max_tokens=200, temperature=0.8):
+    def generate(self, prompt, max_tokens=200, temperature=0.8, use_cache=True):
         """Genera tokens a partir de un prompt (lista de ids).
 
         Usa sampling probabilístico para aumentar la "creatividad".
@@ -66,6 +72,13 @@ class CausalLLM(Transformer):
         max_tokens   Número máximo de tokens a generar.
         temperature  Modula lo "puntiaguda" (determinista) que es la
                      distribución de sampling.
+        use_cache    Si True, guarda keys y values de cada capa (KV cache) y
+                     en cada paso solo procesa el último token. Cuando la
+                     ventana se llena y empieza a deslizarse, las posiciones
+                     de todos los tokens cambian y la cache ya no sirve: a
+                     partir de ahí se recalcula la ventana entera en cada
+                     paso, como sin cache. El resultado es el mismo en ambos
+                     casos.
 
         Devuelve la lista de token ids generados (sin el prompt).
 
@@ -87,9 +100,20 @@ class CausalLLM(Transformer):
         )
 
         generados = []
+        cache = None
         for _ in range(max_tokens):
-            # Calculamos los logits del posible próximo token
-            logits, _ = self(ventana)
+            # Calculamos los logits del posible próximo token. Con cache,
+            # solo hace falta pasar el último token: los anteriores ya están
+            # en ella. La primera vez (cache vacía) se procesa el prompt
+            # entero, y si la ventana está llena hay que recalcularla entera
+            if not use_cache:
+                logits, _ = self(ventana)
+            elif cache is not None and len(cache[0]) < ventana.shape[1]:
+                logits, _ = self(ventana[:, -1:], cache=cache)
+            else:
+                llena = ventana.shape[1] >= self.max_seq_len
+                cache = None if llena else self.new_cache()
+                logits, _ = self(ventana, cache=cache)
             next_token_logits = logits[:, -1, :]
             # Convertimos en una distribución de probabilidad sobre el vocab.
             # Al dividir por la temperatura en el exponente de la exponencial,
@@ -103,3 +127,116 @@ class CausalLLM(Transformer):
             ventana = torch.cat([ventana, next_token_id], dim=1)[:, -self.max_seq_len :]
 
         return generados
+
+    @torch.no_grad()
+    def generate_batch(
+        self,
+        prompts,
+        max_tokens=200,
+        temperature=0.8,
+        top_k=None,
+        top_p=None,
+        stop_ids=(),
+    ):
+        """Genera a partir de varios prompts (listas de ids) a la vez.
+
+        Los prompts se rellenan por la izquierda hasta la misma longitud, de
+        modo que el último token de todos queda en la misma columna y cada paso
+        es un único forward del batch entero. La máscara de relleno impide
+        atender al relleno y las posiciones de cada secuencia empiezan en su
+        primer token real, así que cada prompt genera lo mismo que generaría
+        él solo. Usa KV cache como `generate`.
+
+        prompts      Lista de prompts (listas de ids, no vacías).
+        max_tokens   Número máximo de tokens a generar por prompt.
+        temperature, top_k, top_p  Ver `sample`.
+        stop_ids     Ids que terminan una secuencia (no se incluyen en su
+                     resultado). Se para cuando todas han terminado.
+
+        Devuelve una lista con los ids generados para cada prompt.
+        """
+        self.eval()
+        device = next(self.parameters()).device
+        if not prompts or not all(prompts):
+            raise ValueError("Se necesita al menos un prompt y ninguno vacío")
+
+        # Rellenamos con 0 por la izquierda; el relleno nunca se atiende
+        prompts = [prompt[-self.max_seq_len :] for prompt in prompts]
+        n_tokens = max(len(prompt) for prompt in prompts)
+        ventana = torch.zeros(
+            (len(prompts), n_tokens), dtype=torch.long, device=device
+        )
+        mascara = torch.zeros_like(ventana, dtype=torch.bool)
+        for i, prompt in enumerate(prompts):
+            ventana[i, n_tokens - len(prompt) :] = torch.tensor(prompt)
+            mascara[i, n_tokens - len(prompt) :] = True
+        stop = torch.tensor(list(stop_ids), dtype=torch.long, device=device)
+
+        # Los tokens generados se quedan en el dispositivo hasta el final:
+        # nada de .item() (y su sincronización) en cada paso
+        generados = torch.zeros(
+            (len(prompts), max_tokens), dtype=torch.long, device=device
+        )
+        terminados = torch.zeros(len(prompts), dtype=torch.bool, device=device)
+        cache = None
+        for paso in range(max_tokens):
+            # Posición de cada token dentro de su secuencia (0 en el relleno)
+            pos = (mascara.cumsum(dim=-1) - 1).clamp(min=0)
+            if cache is not None and len(cache[0]) < ventana.shape[1]:
+                logits, _ = self(
+                    ventana[:, -1:], cache=cache, pos=pos[:, -1:], padding_mask=mascara
+                )
+            else:
+                llena = ventana.shape[1] >= self.max_seq_len
+                cache = None if llena else self.new_cache()
+                logits, _ = self(ventana, cache=cache, pos=pos, padding_mask=mascara)
+
+            next_ids = sample(logits[:, -1, :], temperature, top_k, top_p)
+            generados[:, paso] = next_ids[:, 0]
+            terminados |= torch.isin(next_ids[:, 0], stop)
+
+            ventana = torch.cat([ventana, next_ids], dim=1)[:, -self.max_seq_len :]
+            mascara = torch.cat(
+                [mascara, torch.ones_like(next_ids, dtype=torch.bool)], dim=1
+            )[:, -self.max_seq_len :]
+            # Comprobar si han terminado todas obliga a sincronizar, así que
+            # solo lo hacemos de vez en cuando
+            if len(stop) and paso % 16 == 15 and terminados.all():
+                generados = generados[:, : paso + 1]
+                break
+
+        # Cortamos cada secuencia en su primer token de parada
+        stop_set = set(stop_ids)
+        resultados = []
+        for fila in generados.tolist():
+            fin = next(
+                (i for i, id_ in enumerate(fila) if id_ in stop_set), len(fila)
+            )
+            resultados.append(fila[:fin])
+        return resultados
+
+
+def sample(logits, temperature=0.8, top_k=None, top_p=None):
+    """Elige un token por fila de `logits` (batch, vocab), todo en tensores.
+
+    temperature  Divide los logits: <1 más determinista, >1 más variado.
+    top_k        Si se indica, solo se samplea entre los k más probables.
+    top_p        Si se indica, solo entre los más probables que suman al
+                 menos p de probabilidad (nucleus sampling).
+
+    Devuelve un tensor (batch, 1) con los ids elegidos.
+    """
+    logits = logits / temperature
+    if top_k is not None:
+        # Todo lo que quede por debajo del k-ésimo mayor logit se descarta
+        kth = torch.topk(logits, min(top_k, logits.shape[-1]), dim=-1).values[:, -1:]
+        logits = logits.masked_fill(logits < kth, float("-inf"))
+    if top_p is not None:
+        ordenados, indices = torch.sort(logits, dim=-1, descending=True)
+        probs = softmax(ordenados, dim=-1)
+        # Se descarta un token si los más probables que él ya suman top_p (el
+        # más probable siempre se queda)
+        fuera = probs.cumsum(dim=-1) - probs >= top_p
+        ordenados = ordenados.masked_fill(fuera, float("-inf"))
+        logits = torch.full_like(logits, float("-inf")).scatter(-1, indices, ordenados)
+    return torch.multinomial(softmax(logits, dim=-1), 1)
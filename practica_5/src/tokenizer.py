@@ -4,7 +4,28 @@
 # Antonio F. G. Sevilla <afgs@ucm.es>
 
 
-from collections import Counter
+import codecs
+from collections import Counter, deque
+import hashlib
+import heapq
+import json
+import os
+from pathlib import Path
+import re
+
+import numpy as np
+
+
+# Trozos más largos no se guardan en la cache de encode (serían casi únicos)
+_CACHE_MAX_CHARS = 64
+# Por debajo de este tamaño no compensa arrancar procesos para encode
+_PARALLEL_MIN_CHARS = 1_000_000
+# Pre-tokenizador del modo por bytes (el de GPT-2, con letras y dígitos de
+# `re` en lugar de \p{L} y \p{N}): contracciones inglesas, palabras,
+# números y signos, cada uno con el espacio que lleven delante, y espacios
+_PRETOKENS = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+"
+)
 
 
 class BPETokenizer:
@@ -14,28 +35,102 @@ class BPETokenizer:
     entrenamiento se buscan los pares adyacentes mas frecuentes y se
     fusionan en nuevos tokens, hasta alcanzar `vocab_size` tokens.
 
-    NOTA: para ser BPE de verdad, tendríamos que hacerlo sobre bytes, no sobre
-    caracteres, pero para la práctica funciona bien.
+    NOTA: con `byte_level=False` se trabaja sobre caracteres, no bytes: los
+    caracteres que no aparecían en el texto de entrenamiento se codifican
+    como el token 0. Con `byte_level=True` es BPE "de verdad":
+
+    - El vocabulario inicial son los 256 bytes, así que se puede codificar
+      cualquier texto, y los tokens son `bytes` en vez de `str`.
+    - El texto se pre-tokeniza primero con `_PRETOKENS` (palabras, números,
+      signos...) y los merges no cruzan de una pieza a otra.
     """
 
-    def __init__(self, text, vocab_size=300):
+    def __init__(self, text, vocab_size=300, byte_level=False):
         self.vocab_size = vocab_size
-        # Inicializamos con caracteres encontrados en el texto
-        self.vocab = sorted(set(text))  # vocab[id] -> token string.
+        self.byte_level = byte_level
+        fronteras = ()
+        if byte_level:
+            if vocab_size < 256:
+                raise ValueError("Con byte_level, vocab_size tiene que ser >= 256")
+            self.vocab = [bytes([b]) for b in range(256)]
+            # Cada pieza del pre-tokenizador se entrena por separado: sus
+            # bytes van seguidos y `fronteras` marca dónde acaba cada una
+            tokens, fronteras = [], set()
+            for pieza in _PRETOKENS.findall(text):
+                tokens.extend(pieza.encode("utf-8"))
+                fronteras.add(len(tokens) - 1)
+        else:
+            # Inicializamos con caracteres encontrados en el texto
+            self.vocab = sorted(set(text))  # vocab[id] -> token string.
         self.tok2id = {tok: i for i, tok in enumerate(self.vocab)}
 
-        tokens = [self.tok2id[c] for c in text]
+        if not byte_level:
+            tokens = [self.tok2id[c] for c in text]
         self.merges = []  # lista de ((id_a, id_b), nuevo_id), para encode()
 
-        for new_id in range(len(self.vocab), vocab_size):
-            pairs = Counter(zip(tokens, tokens[1:]))
-            best = pairs.most_common(1)[0][0]
+        merges = _train_merges(tokens, len(self.vocab), vocab_size, fronteras)
+        for best, new_id in merges:
             new_tok = self.vocab[best[0]] + self.vocab[best[1]]
             self.tok2id[new_tok] = new_id
             self.vocab.append(new_tok)
             self.merges.append((best, new_id))
 
-            tokens = self._apply_merge(tokens, best[0], best[1], new_id)
+        self._preparar_encode()
+
+    def _preparar_encode(self):
+        """Tablas derivadas de vocab y merges que usa `encode`."""
+        # (id_a, id_b) -> id del token fusionado. Los ids crecen con el orden
+        # de aprendizaje, así que sirven también de rango del merge
+        self._merge_ids = dict(self.merges)
+        # Pares de caracteres consecutivos dentro de algún token (ver _trozos)
+        if not self.byte_level:
+            self._bigramas = {
+                tok[k : k + 2] for tok in self.vocab for k in range(len(tok) - 1)
+            }
+        # Trozo de texto -> sus ids
+        self._cache = {}
+
+    def save(self, path):
+        """Guarda vocabulario y merges en un JSON que carga `load`."""
+        Path(path).write_text(self._serializar(), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path):
+        """Carga un tokenizador guardado con `save`, sin reentrenarlo."""
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        tokenizer = cls.__new__(cls)
+        tokenizer.vocab_size = data["vocab_size"]
+        # Ficheros anteriores al modo por bytes no llevan "byte_level"
+        tokenizer.byte_level = data.get("byte_level", False)
+        tokenizer.vocab = data["vocab"]
+        if tokenizer.byte_level:
+            tokenizer.vocab = [bytes.fromhex(tok) for tok in tokenizer.vocab]
+        tokenizer.tok2id = {tok: i for i, tok in enumerate(tokenizer.vocab)}
+        tokenizer.merges = [((a, b), new_id) for a, b, new_id in data["merges"]]
+        tokenizer._preparar_encode()
+        return tokenizer
+
+    def fingerprint(self):
+        """Hash de vocabulario y merges: cambia si cambia lo que sale de encode."""
+        return hashlib.sha256(self._serializar().encode("utf-8")).hexdigest()
+
+    def _serializar(self):
+        return json.dumps(
+            {
+                "vocab_size": self.vocab_size,
+                "byte_level": self.byte_level,
+                # Los tokens en bytes no tienen por qué ser UTF-8 válido
+                "vocab": [tok.hex() for tok in self.vocab]
+                if self.byte_level
+                else self.vocab,
+                "merges": [[a, b, new_id] for (a, b), new_id in self.merges],
+            },
+            ensure_ascii=False,
+        )
+
+    def __getstate__(self):
+        # Para el encode en paralelo: la cache no viaja a los otros procesos
+        return {**self.__dict__, "_cache": {}}
 
     @staticmethod
     def _apply_merge(tokens, a, b, new_id):
@@ -51,23 +146,373 @@ class BPETokenizer:
                 i += 1
         return merged
 
-    def encode(self, text):
-        """Codifica un texto aplicando los merges aprendidos."""
-        tokens = [self.tok2id.get(c, 0) for c in text]
-        for (a, b), new_id in self.merges:
-            tokens = self._apply_merge(tokens, a, b, new_id)
+    def encode(self, text, n_workers=1):
+        """Codifica un texto aplicando los merges aprendidos.
+
+        Equivale a aplicar `_apply_merge` con cada merge, en orden, sobre el
+        texto entero (o sobre cada pieza, en el modo por bytes), pero sin
+        recorrerlo una vez por merge:
+
+        - El texto se parte en trozos por los puntos que ningún token del
+          vocabulario cruza (ver `_trozos`); cada trozo se codifica por
+          separado y los repetidos salen de una cache.
+        - En cada trozo se fusiona siempre el par de menor rango (el merge
+          aprendido antes) que haya, y entre iguales el de más a la
+          izquierda. Un merge solo crea pares con el token nuevo, que tienen
+          rango mayor, así que es el mismo orden que aplicar los merges uno
+          tras otro.
+
+        Con `n_workers` > 1 y textos grandes, el texto se parte en bloques
+        que se codifican en varios procesos (como mucho uno por CPU
+        disponible: con una sola CPU solo añadiría trabajo).
+        """
+        n_workers = min(n_workers, cpus_disponibles())
+        if n_workers > 1 and len(text) >= _PARALLEL_MIN_CHARS:
+            return self._encode_parallel(text, n_workers)
+        tokens = []
+        for trozo in self._trozos(text):
+            tokens.extend(self._encode_trozo(trozo))
+        return tokens
+
+    def _trozos(self, text):
+        """Parte `text` entre dos caracteres que no van juntos en ningún token.
+
+        Si ningún token contiene ese par de caracteres, ningún merge puede
+        unir lo que queda a cada lado, así que se codifican por separado y
+        el resultado es el mismo. (No vale partir por espacios: los merges
+        aprendidos sobre el texto entero los cruzan, como "e " o " the".)
+
+        En el modo por bytes los trozos son directamente las piezas del
+        pre-tokenizador.
+        """
+        if self.byte_level:
+            yield from _PRETOKENS.findall(text)
+            return
+        # Los caracteres desconocidos se codifican como el token 0
+        desconocido = self.vocab[0]
+        inicio = 0
+        anterior = None
+        for i, c in enumerate(text):
+            if c not in self.tok2id:
+                c = desconocido
+            if anterior is not None and anterior + c not in self._bigramas:
+                yield text[inicio:i]
+                inicio = i
+            anterior = c
+        if inicio < len(text):
+            yield text[inicio:]
+
+    def _encode_trozo(self, trozo):
+        tokens = self._cache.get(trozo)
+        if tokens is None:
+            if self.byte_level:
+                # Los ids de los bytes son los propios bytes
+                ids = list(trozo.encode("utf-8"))
+            else:
+                ids = [self.tok2id.get(c, 0) for c in trozo]
+            tokens = _merge_by_rank(ids, self._merge_ids)
+            if len(trozo) <= _CACHE_MAX_CHARS:
+                self._cache[trozo] = tokens
         return tokens
 
+    def _encode_parallel(self, text, n_workers):
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Cortes en len(text) * i / n_workers, movidos al punto seguro más
+        # cercano: no hace falta recorrer el texto entero para elegirlos
+        cortes = [0]
+        for i in range(1, n_workers):
+            corte = self._corte_cercano(text, len(text) * i // n_workers)
+            if corte is not None and corte > cortes[-1]:
+                cortes.append(corte)
+        cortes.append(len(text))
+        bloques = [text[a:b] for a, b in zip(cortes, cortes[1:])]
+
+        # Cada proceso recibe el tokenizador una sola vez, al arrancar, y
+        # luego solo su bloque de texto; devuelve los ids como array
+        with ProcessPoolExecutor(
+            max_workers=len(bloques),
+            initializer=_iniciar_worker,
+            initargs=(self,),
+        ) as pool:
+            partes = list(pool.map(_encode_bloque, bloques))
+        return np.concatenate(partes).tolist()
+
+    def _corte_cercano(self, text, i):
+        """Posición segura para partir `text` más cercana a `i` (o None).
+
+        Segura quiere decir que codificar cada lado por separado da lo mismo
+        que codificar el texto entero: un punto donde `_trozos` partiría.
+        """
+        for distancia in range(max(i, len(text) - i)):
+            for j in (i - distancia, i + distancia):
+                if 0 < j < len(text) and self._se_puede_cortar(text, j):
+                    return j
+        return None
+
+    def _se_puede_cortar(self, text, j):
+        if self.byte_level:
+            # Justo antes de un espacio entre dos caracteres que no lo son:
+            # el pre-tokenizador une el espacio a lo que sigue y ninguna
+            # pieza anterior puede llegar hasta él
+            return (
+                text[j] == " "
+                and not text[j - 1].isspace()
+                and j + 1 < len(text)
+                and not text[j + 1].isspace()
+            )
+        desconocido = self.vocab[0]
+        a = text[j - 1] if text[j - 1] in self.tok2id else desconocido
+        b = text[j] if text[j] in self.tok2id else desconocido
+        return a + b not in self._bigramas
+
     def decode(self, ids):
         """Decodifica una lista de ids a texto."""
-        caracteres = [self.vocab[id_] for id_ in ids]
-        return caracteres
+        return "".join(self.decode_stream(ids))
+
+    def decode_stream(self, ids):
+        """Decodifica `ids` poco a poco: genera el texto de cada id.
+
+        Sirve para ir mostrando lo que genera el modelo según sale. En el
+        modo por bytes, un carácter puede quedar repartido entre varios
+        tokens: el decodificador incremental de UTF-8 se guarda los bytes
+        sueltos hasta completarlo (y los inválidos salen como "�").
+        """
+        if not self.byte_level:
+            for id_ in ids:
+                yield self.vocab[id_]
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for id_ in ids:
+            if texto := decoder.decode(self.vocab[id_]):
+                yield texto
+        if texto := decoder.decode(b"", final=True):
+            yield texto
 
     def __repr__(self):
-        pretty = [t.replace("\n", "\\n").replace(" ", "▁") for t in self.vocab]
+        vocab = self.vocab
+        if self.byte_level:
+            vocab = [t.decode("utf-8", errors="backslashreplace") for t in vocab]
+        pretty = [t.replace("\n", "\\n").replace(" ", "▁") for t in vocab]
         return f"{len(self.vocab)} tokens: ['{"', '".join(pretty)}']"
 
 
+def cpus_disponibles():
+    """CPUs que puede usar este proceso."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Tokenizador de cada proceso del encode en paralelo (ver _encode_parallel)
+_tokenizer_worker = None
+
+
+def _iniciar_worker(tokenizer):
+    global _tokenizer_worker
+    _tokenizer_worker = tokenizer
+
+
+def _encode_bloque(bloque):
+    return np.array(_tokenizer_worker.encode(bloque), dtype=np.int32)
+
+
+def load_or_train(text, vocab_size=300, cache_dir="cache", byte_level=False):
+    """Tokenizador para `text`, entrenado una vez y guardado en `cache_dir`.
+
+    El fichero va por hash del corpus, `vocab_size` y modo: si cambia
+    cualquiera de ellos se entrena otro.
+    """
+    modo = "-bytes" if byte_level else ""
+    path = Path(cache_dir) / f"bpe-{_text_hash(text)}-{vocab_size}{modo}.json"
+    if path.exists():
+        return BPETokenizer.load(path)
+    tokenizer = BPETokenizer(text, vocab_size=vocab_size, byte_level=byte_level)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tokenizer.save(path)
+    return tokenizer
+
+
+def encode_cached(tokenizer, text, cache_dir="cache", n_workers=1):
+    """`tokenizer.encode(text)` como array de numpy mapeado desde disco.
+
+    La primera vez se codifica y se guarda en `cache_dir`, con el hash del
+    corpus y el del tokenizador en el nombre; las siguientes solo se mapea
+    el fichero, sin leerlo entero ni tokenizar. Los ids se guardan en
+    uint16 si caben (vocabularios de hasta 65536 tokens) y si no en int32.
+    """
+    dtype = np.uint16 if len(tokenizer.vocab) <= 1 << 16 else np.int32
+    nombre = f"{_text_hash(text)}-{tokenizer.fingerprint()[:16]}"
+    path = Path(cache_dir) / f"{nombre}.{np.dtype(dtype).name}"
+    if not path.exists():
+        ids = np.array(tokenizer.encode(text, n_workers=n_workers), dtype=dtype)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Escribimos aparte y renombramos, para no dejar un fichero a medias
+        # si se interrumpe
+        tmp = path.with_suffix(".tmp")
+        ids.tofile(tmp)
+        os.replace(tmp, path)
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=dtype)  # np.memmap no admite ficheros vacíos
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _merge_by_rank(tokens, ranks):
+    """Aplica a `tokens` los merges de `ranks` en orden de rango.
+
+    Lista enlazada de posiciones y heap de (rango, posición) con los pares
+    fusionables; las entradas que dejan de ser válidas se descartan al salir.
+    """
+    n = len(tokens)
+    if n < 2:
+        return tokens
+    tok = list(tokens)
+    prev = list(range(-1, n - 1))
+    next_ = list(range(1, n + 1))
+    next_[-1] = -1
+    heap = [
+        (rank, i)
+        for i, pair in enumerate(zip(tokens, tokens[1:]))
+        if (rank := ranks.get(pair)) is not None
+    ]
+    heapq.heapify(heap)
+
+    while heap:
+        rank, i = heapq.heappop(heap)
+        j = next_[i]
+        if tok[i] == -1 or j == -1 or ranks.get((tok[i], tok[j])) != rank:
+            continue
+        # El rango es el id del token fusionado
+        tok[i], tok[j] = rank, -1
+        nn = next_[j]
+        next_[i] = nn
+        if nn != -1:
+            prev[nn] = i
+            if (r := ranks.get((rank, tok[nn]))) is not None:
+                heapq.heappush(heap, (r, i))
+        p = prev[i]
+        if p != -1 and (r := ranks.get((tok[p], rank))) is not None:
+            heapq.heappush(heap, (r, p))
+
+    return [t for t in tok if t != -1]
+
+
+def _train_merges(tokens, first_id, vocab_size, fronteras=()):
+    """Genera los merges ((id_a, id_b), nuevo_id) de BPE sobre `tokens`.
+
+    `fronteras` son posiciones i tras las que empieza otra pieza: el par
+    (tokens[i], tokens[i + 1]) no cuenta y nunca se fusiona.
+
+    La versión directa recuenta todos los pares y reescribe la lista entera
+    de tokens en cada merge: O(merges × texto). Aquí se cuentan una vez y se
+    actualizan solo alrededor de cada sustitución:
+
+    - Los tokens forman una lista doblemente enlazada (prev/next por
+      posición), así que fusionar dos tokens es O(1) y cada posición
+      conserva su índice original.
+    - `positions[par]` guarda, en orden, las posiciones donde empieza el par.
+      Las que dejan de serlo no se borran; se descartan al recorrerlas.
+    - Un heap da el par a fusionar con clave (-frecuencia, primera posición,
+      par). Sus entradas pueden quedar anticuadas, pero un par solo pierde
+      apariciones (las nuevas son siempre de pares con el token recién
+      creado), así que una entrada anticuada nunca está por debajo de su
+      valor real: basta corregirla cuando llega a la cima.
+
+    El resultado es idéntico al de `Counter(...).most_common(1)` sobre la
+    lista completa: se cuentan apariciones solapadas ("aaa" tiene dos "aa"),
+    los empates los gana el par que aparece antes en el texto y cada merge
+    se aplica de izquierda a derecha sin solapes, como `_apply_merge`.
+    """
+    n = len(tokens)
+    tok = list(tokens)  # tok[i] = -1 si la posición i se ha fusionado
+    prev = list(range(-1, n - 1))
+    next_ = list(range(1, n + 1))
+    next_[-1:] = [-1]
+    for i in fronteras:
+        if i + 1 < n:
+            next_[i], prev[i + 1] = -1, -1
+
+    counts = Counter()
+    positions = {}
+    for i, pair in enumerate(zip(tokens, tokens[1:])):
+        if next_[i] == -1:
+            continue
+        counts[pair] += 1
+        positions.setdefault(pair, deque()).append(i)
+
+    def es_par(i, pair):
+        j = next_[i]
+        return tok[i] == pair[0] and j != -1 and tok[j] == pair[1]
+
+    def primera(pair):
+        # Descarta las posiciones iniciales que ya no son de este par
+        cola = positions[pair]
+        while not es_par(cola[0], pair):
+            cola.popleft()
+        return cola[0]
+
+    heap = [(-count, positions[pair][0], pair) for pair, count in counts.items()]
+    heapq.heapify(heap)
+
+    for new_id in range(first_id, vocab_size):
+        # Sacamos el mejor par, corrigiendo por el camino las entradas viejas
+        while heap:
+            pair = heap[0][2]
+            count = counts[pair]
+            if count == 0:
+                heapq.heappop(heap)
+                continue
+            key = (-count, primera(pair), pair)
+            if key == heap[0]:
+                break
+            heapq.heapreplace(heap, key)
+        if not heap:
+            break
+        best = heapq.heappop(heap)[2]
+        a, b = best
+
+        nuevos = []  # pares con el token nuevo
+        for i in positions.pop(best):
+            # Puede haberla consumido un merge anterior de este mismo par
+            if not es_par(i, best):
+                continue
+            j = next_[i]
+            p, nn = prev[i], next_[j]
+            # Desaparecen los pares (tok[p], a), (a, b) y (b, tok[nn])...
+            if p != -1:
+                counts[tok[p], a] -= 1
+            counts[best] -= 1
+            if nn != -1:
+                counts[b, tok[nn]] -= 1
+            # ...se fusionan i y j en la posición i...
+            tok[i], tok[j] = new_id, -1
+            next_[i] = nn
+            if nn != -1:
+                prev[nn] = i
+            # ...y aparecen (tok[p], nuevo) y (nuevo, tok[nn]). Como
+            # recorremos i en orden, sus posiciones se añaden ya ordenadas
+            if p != -1:
+                counts[tok[p], new_id] += 1
+                positions.setdefault((tok[p], new_id), deque()).append(p)
+                nuevos.append((tok[p], new_id))
+            if nn != -1:
+                counts[new_id, tok[nn]] += 1
+                positions.setdefault((new_id, tok[nn]), deque()).append(i)
+                nuevos.append((new_id, tok[nn]))
+        del counts[best]
+
+        # Los pares nuevos entran al heap con su frecuencia final del paso
+        for pair in set(nuevos):
+            if counts[pair]:
+                heapq.heappush(heap, (-counts[pair], primera(pair), pair))
+
+        yield best, new_id
+
+
 # Si ejecutamos este módulo directamente, probamos el tokenizador
 if __name__ == "__main__":
     import sys
@@ -78,3 +523,11 @@ if __name__ == "__main__":
     textos = "\n\n".join(open(p).read() for p in files_path.glob("*.txt"))
     tokenizer = BPETokenizer(textos, vocab_size=vocab_size)
     print(tokenizer)
+
+    # En el modo por bytes se puede codificar cualquier texto
+    tokenizer = BPETokenizer(
+        textos, vocab_size=max(vocab_size, 256) + 100, byte_level=True
+    )
+    prueba = "¡Alicia vio un 🐇 blanco!"
+    ids = tokenizer.encode(prueba)
+    print(ids, tokenizer.decode(ids) == prueba)
@@ -3,50 +3,128 @@
 # PLN 2025/2026 (FDI UCM)
 # Antonio F. G. Sevilla <afgs@ucm.es>
 
+import math
 import time
 
+import numpy as np
 import torch
 from loguru import logger
-from torch.utils.data import DataLoader, Dataset
 
 
-class TextDataset(Dataset):
-    """Ventana deslizante sobre un tensor de tokens para language modeling.
+class TokenWindows:
+    """Ventanas deslizantes sobre un array de tokens para language modeling.
 
     Cada sample es un par (x, y) de longitud `seq_len`, donde y es x
-    desplazado una posicion a la derecha (predecir el siguiente token).
+    desplazado una posicion a la derecha (predecir el siguiente token). Se
+    itera por batches (x, y) y cada batch sale de una sola operación: se
+    eligen los inicios de las ventanas y se leen todas de golpe con un
+    índice (batch, seq_len + 1), sin `__getitem__` ni `collate` por muestra.
+
+    `data` puede ser un `np.memmap` (ver `tokenizer.encode_cached`): solo se
+    leen de disco las ventanas de cada batch, así que el corpus no tiene que
+    caber en memoria.
+
+    - Las ventanas empiezan cada `stride` tokens: con stride 1 hay una por
+      posicion y se solapan casi enteras; con stride = seq_len no se solapan.
+    - Sin `shuffle`, se recorren todas en orden.
+    - Con `shuffle`, los inicios son aleatorios (con reemplazo). Una epoch
+      son `steps` batches, o si no se indica, tantas ventanas como haya.
+      Con `seed`, cada recorrido repite las mismas ventanas (un subconjunto
+      fijo, para validar siempre sobre lo mismo).
     """
 
-    def __init__(self, data, seq_len):
+    def __init__(
+        self, data, seq_len, batch_size, stride=1, shuffle=False, steps=None, seed=None
+    ):
         self.data = data
         self.seq_len = seq_len
+        self.batch_size = batch_size
+        self.stride = stride
+        self.shuffle = shuffle
+        self.steps = steps
+        self.seed = seed
+        self.n_windows = _n_windows(len(data), seq_len, stride)
 
     def __len__(self):
-        return len(self.data) - self.seq_len
-
-    def __getitem__(self, idx):
-        x = self.data[idx : idx + self.seq_len]
-        y = self.data[idx + 1 : idx + self.seq_len + 1]
-        return x, y
-
-
-def _make_dataloaders(tokens, context_size, batch_size, train_ratio=0.9):
+        if self.shuffle and self.steps is not None:
+            return self.steps if self.n_windows else 0
+        return math.ceil(self.n_windows / self.batch_size)
+
+    def __iter__(self):
+        offsets = torch.arange(self.seq_len + 1)
+        generator = None
+        if self.seed is not None:
+            generator = torch.Generator().manual_seed(self.seed)
+        for b in range(len(self)):
+            if self.shuffle:
+                starts = torch.randint(
+                    self.n_windows, (self.batch_size,), generator=generator
+                )
+            else:
+                inicio = b * self.batch_size
+                starts = torch.arange(
+                    inicio, min(inicio + self.batch_size, self.n_windows)
+                )
+            starts *= self.stride
+            # Una única lectura para todo el batch, ya en int64 para el modelo
+            windows = self.data[(starts[:, None] + offsets).numpy()]
+            windows = torch.from_numpy(windows.astype(np.int64))
+            yield windows[:, :-1], windows[:, 1:]
+
+
+def _n_windows(n_tokens, seq_len, stride):
+    # Inicios 0, stride, 2*stride... que dejan sitio a x e y (seq_len + 1)
+    return max(0, (n_tokens - seq_len - 1) // stride + 1)
+
+
+def _make_dataloaders(
+    tokens,
+    context_size,
+    batch_size,
+    train_ratio=0.9,
+    stride=1,
+    steps_per_epoch=None,
+    val_steps=None,
+    val_seed=0,
+):
     """Los dataloaders se encargan de ir aportando pares para el entrenamiento,
-    incluyendo batching, mezcla aleatoria, etc."""
-    data = torch.tensor(tokens, dtype=torch.long)
+    incluyendo batching, mezcla aleatoria, etc.
+
+    Con `steps_per_epoch`, cada epoch de train son ese número de batches de
+    ventanas aleatorias. Con `val_steps`, la validación usa siempre los
+    mismos `val_steps` batches aleatorios (semilla `val_seed`) en vez de
+    todas las ventanas.
+    """
+    # Si `tokens` es un memmap se queda en disco: los cortes de train y val
+    # son vistas sobre el mismo fichero
+    data = tokens if isinstance(tokens, np.ndarray) else np.asarray(tokens)
 
     # Separamos datos en entrenamiento y validación
     split = int(train_ratio * len(data))
-    train_ds = TextDataset(data[:split], context_size)
-    val_ds = TextDataset(data[split:], context_size)
-    logger.info(f"Train: {len(train_ds):,} muestras, Val: {len(val_ds):,}")
-
-    # Los dataloaders implementan utilidades para el entrenamiento de
-    # modelos. Devolvemos uno para train y otro para val
-    return (
-        DataLoader(train_ds, batch_size=batch_size, shuffle=True),
-        DataLoader(val_ds, batch_size=batch_size),
+    train_dl = TokenWindows(
+        data[:split],
+        context_size,
+        batch_size,
+        stride=stride,
+        shuffle=True,
+        steps=steps_per_epoch,
+    )
+    val_dl = TokenWindows(
+        data[split:],
+        context_size,
+        batch_size,
+        stride=stride,
+        shuffle=val_steps is not None,
+        steps=val_steps,
+        seed=val_seed,
     )
+    logger.info(
+        f"Train: {train_dl.n_windows:,} muestras ({len(train_dl)} batches/epoch), "
+        f"Val: {val_dl.n_windows:,} ({len(val_dl)} batches)"
+    )
+
+    # Devolvemos un iterador de batches para train y otro para val
+    return train_dl, val_dl
 
 
 def _run_epoch(model, dataloader, optimizer=None):
@@ -99,14 +177,26 @@ def train(
     batch_size=64,
     lr=3e-4,
     train_ratio=0.9,
+    stride=1,
+    steps_per_epoch=None,
+    val_steps=None,
 ):
     """Entrena el modelo de lenguaje causal sobre los tokens dados.
 
     Realiza `epochs` épocas de entrenamiento con AdamW, registrando train/val
-    loss en cada época.
+    loss en cada época. `stride`, `steps_per_epoch` y `val_steps` definen
+    qué es una época (ver `_make_dataloaders`).
     """
 
-    train_dl, val_dl = _make_dataloaders(tokens, context_size, batch_size, train_ratio)
+    train_dl, val_dl = _make_dataloaders(
+        tokens,
+        context_size,
+        batch_size,
+        train_ratio,
+        stride=stride,
+        steps_per_epoch=steps_per_epoch,
+        val_steps=val_steps,
+    )
 
     # El optimizador ajusta los parámetros que le pasamos en función del
     # gradiente (calculado con forward y backward) y la tasa de aprendizaje
@@ -130,7 +220,7 @@ if __name__ == "__main__":
     import sys
 
     from causalLLM import CausalLLM
-    from tokenizer import BPETokenizer
+    from tokenizer import encode_cached, load_or_train
     import sys
     from pathlib import Path
 
@@ -143,9 +233,14 @@ if __name__ == "__main__":
     VOCAB_SIZE = 300
     CONTEXT_SIZE = 128
     EPOCHS=10
+    # Cada epoch son STEPS_PER_EPOCH batches de ventanas aleatorias y se
+    # valida siempre sobre los mismos VAL_STEPS batches
+    STEPS_PER_EPOCH = 1000
+    VAL_STEPS = 50
 
-    tokenizer = BPETokenizer(text, vocab_size=VOCAB_SIZE)
-    tokens = tokenizer.encode(text)
+    # Tokenizador y corpus codificado se guardan en cache/ la primera vez
+    tokenizer = load_or_train(text, vocab_size=VOCAB_SIZE)
+    tokens = encode_cached(tokenizer, text)
 
     model = CausalLLM(
         vocab_size=tokenizer.vocab_size,
@@ -157,22 +252,26 @@ if __name__ == "__main__":
         dropout=0.2,
     ).to(device)
 
-    train(model, tokens, epochs=EPOCHS, context_size=CONTEXT_SIZE)
+    train(
+        model,
+        tokens,
+        epochs=EPOCHS,
+        context_size=CONTEXT_SIZE,
+        steps_per_epoch=STEPS_PER_EPOCH,
+        val_steps=VAL_STEPS,
+    )
     torch.save(model.state_dict(), "pesos_modelo.pth")
 
     prompt = "alice and the cat were studying for the exam. what "
     pred = model.generate(tokenizer.encode(prompt), max_tokens=200)
 
-    # 1. Obtenemos el resultado del decode (que en tu caso es una lista)
-    resultado_decode = tokenizer.decode(pred)
-
-    # 2. Creamos la versión string (uniendo los elementos de la lista)
-    frase_string = "".join(resultado_decode)
+    # decode devuelve directamente el texto
+    frase_string = tokenizer.decode(pred)
 
     # --- VISUALIZACIÓN ---
 
-    # Opción A: Ver la LISTA (formato técnico con corchetes y comas)
-    logger.info(f"VERSIÓN LISTA: {resultado_decode}")
+    # Opción A: Ver los TOKENS (el texto de cada uno, tal como van saliendo)
+    logger.info(f"VERSIÓN LISTA: {list(tokenizer.decode_stream(pred))}")
 
     # Opción B: Ver el STRING (frase fluida y limpia)
     logger.opt(colors=True).info(f"VERSIÓN STRING: <cyan>{prompt}</cyan>{frase_string[:500]}")
@@ -6,7 +6,7 @@
 import torch
 import torch.nn as nn
 
-from attention import Attention
+from attention import BACKENDS, Attention, KVCache
 
 
 class FeedForward(nn.Module):
@@ -49,8 +49,8 @@ class Block(nn.Module):
         self.norm2 = nn.LayerNorm(d_model)
         self.ff = FeedForward(d_model, expansion, dropout)
 
-    def forward(self, x, causal=True):
-        z = x + self.attn(self.norm1(x), causal)
+    def forward(self, x, causal=True, cache=None, padding_mask=None):
+        z = x + self.attn(self.norm1(x), causal, cache, padding_mask)
         f2 = z + self.ff(self.norm2(x))
         return f2
 
@@ -95,20 +95,44 @@ class Transformer(nn.Module):
         # Una última normalización final
         self.norm = nn.LayerNorm(d_model)
 
-    def forward(self, idx, causal=True):
+    def set_attention_backend(self, backend):
+        """Cambia la implementación de la atención de todos los bloques."""
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend} (usa uno de {BACKENDS})")
+        for block in self.blocks:
+            block.attn.backend = backend
+
+    def new_cache(self):
+        """Una KVCache vacía por bloque, para pasar a forward al generar."""
+        return [KVCache() for _ in self.blocks]
+
+    def forward(self, idx, causal=True, cache=None, pos=None, padding_mask=None):
         """Devuelve los hidden states para cada token de idx.
 
         idx     Tensor (batch, n_tokens) con ids de tokens
         causal  Si True, la atención es causal (solo mira tokens anteriores)
+        cache   Lista de KVCache (ver new_cache). Si se pasa, idx son los
+                tokens que siguen a los ya guardados en la cache, y solo se
+                calculan sus hidden states
+        pos     Tensor (batch, n_tokens) con la posición de cada token; por
+                defecto, consecutivas tras las de la cache. Con relleno a la
+                izquierda, cada secuencia empieza en 0 en su primer token real
+        padding_mask  Tensor (batch, n_keys) de bool, ver Attention
         """
         _, n_tokens = idx.shape
+        # Con cache, los tokens nuevos van detrás de los ya procesados
+        inicio = len(cache[0]) if cache is not None else 0
 
         # Los tokens de vocabulario se entrenan, los posicionales se calculan
         # directamente (en GPU si estamos usando GPU)
-        pos = self.pos_emb(torch.arange(n_tokens, device=idx.device))
+        if pos is None:
+            pos = torch.arange(inicio, inicio + n_tokens, device=idx.device)
+        pos = self.pos_emb(pos)
         emb = self.tok_emb(idx)
         x = self.drop(emb + pos)
-        for block in self.blocks:
-            x = block(x, causal)
+        for i, block in enumerate(self.blocks):
+            x = block(
+                x, causal, cache[i] if cache is not None else None, padding_mask
+            )
         return self.norm(x)
 